@@ -2,7 +2,6 @@
 Database connection and initialization - inspired by Goose's session manager
 """
 import sqlite3
-import shutil
 import os
 from pathlib import Path
 from typing import Optional
@@ -39,6 +38,10 @@ class Database:
         
         self.db_path = db_path
         self._connection: Optional[sqlite3.Connection] = None
+        self._fts_connection: Optional[sqlite3.Connection] = None
+        # Bumped when the connection is replaced or the file restored, since
+        # neither shows up in total_changes or data_version; see change_version()
+        self._generation = 0
         
     def connect(self) -> sqlite3.Connection:
         """Get or create database connection"""
@@ -50,11 +53,31 @@ class Database:
             )
             # Enable foreign keys
             self._connection.execute("PRAGMA foreign_keys = ON")
+            # WAL lets the web app and MCP server read while the other writes,
+            # and with synchronous=NORMAL an autocommit write no longer fsyncs
+            # on every statement (only at checkpoints)
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            self._connection.execute("PRAGMA busy_timeout = 5000")
+            self._connection.execute("PRAGMA temp_store = MEMORY")
             # Use Row factory for dict-like access
             self._connection.row_factory = sqlite3.Row
             
         return self._connection
     
+    def fts_connection(self) -> sqlite3.Connection:
+        """
+        Get or create the secondary connection used for FTS5 queries.
+        
+        FTS queries run on their own connection to avoid the initialize()
+        issue with the autocommit one; it is opened once and closed by close().
+        """
+        if self._fts_connection is None:
+            self._fts_connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._fts_connection.row_factory = sqlite3.Row
+            self._fts_connection.execute("PRAGMA busy_timeout = 5000")
+        return self._fts_connection
+    
     def initialize(self):
         """Initialize database schema, running migrations if needed."""
         conn = self.connect()
@@ -147,7 +170,6 @@ class Database:
     def fts5_available(self) -> bool:
         """Check if FTS5 is available in this SQLite build."""
         try:
-            import sqlite3
             conn = sqlite3.connect(":memory:")
             conn.execute("CREATE VIRTUAL TABLE _fts5_test USING fts5(content)")
             conn.execute("DROP TABLE _fts5_test")
@@ -198,7 +220,9 @@ class Database:
         """
         Restore the database from a backup file.
         
-        Closes the current connection, replaces the db file, and reconnects.
+        Copies the backup in through SQLite's online backup API rather than
+        over the file, so the WAL stays consistent for every open connection
+        (including other processes such as the MCP server).
         
         Args:
             backup_path: Path to the backup file.
@@ -212,14 +236,21 @@ class Database:
             return False
         
         try:
-            # Close current connection
-            self.close()
+            conn = self.connect()
+            if conn.in_transaction:
+                # e.g. a migration that failed part-way
+                conn.rollback()
             
-            # Replace the database file
-            shutil.copy2(str(backup_file), self.db_path)
+            # Replace the database contents page by page
+            backup_conn = sqlite3.connect(str(backup_file))
+            try:
+                backup_conn.backup(conn)
+            finally:
+                backup_conn.close()
             
-            # Reconnect and verify
-            conn = self.connect()
+            self._generation += 1
+            
+            # Verify
             cursor = conn.cursor()
             cursor.execute("PRAGMA integrity_check")
             result = cursor.fetchone()
@@ -346,11 +377,31 @@ class Database:
         cursor = self.execute(query, params)
         return cursor.fetchall()
     
+    def data_version(self) -> int:
+        """Return SQLite's data_version, which changes whenever another connection commits"""
+        return self.fetchone("PRAGMA data_version")[0]
+    
+    def change_version(self) -> tuple:
+        """
+        Cheap marker that changes after any write to the database.
+        
+        total_changes covers every INSERT/UPDATE/DELETE on this connection
+        (including trigger and foreign-key cascade changes), data_version
+        covers commits from other connections and processes, and the
+        generation covers restores and reconnects.
+        """
+        conn = self.connect()
+        return (self._generation, conn.total_changes, self.data_version())
+    
     def close(self):
-        """Close database connection"""
+        """Close database connections"""
+        self._generation += 1
         if self._connection:
             self._connection.close()
             self._connection = None
+        if self._fts_connection:
+            self._fts_connection.close()
+            self._fts_connection = None
     
     def __enter__(self):
         """Context manager entry"""
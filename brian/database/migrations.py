@@ -151,6 +151,17 @@ MIGRATIONS = {
         """INSERT INTO knowledge_search(rowid, id, title, content)
            SELECT rowid, id, title, content FROM knowledge_items""",
     ],
+    9: [
+        # Cache fetched link previews by URL hash
+        """CREATE TABLE IF NOT EXISTS link_metadata_cache (
+            url_hash TEXT PRIMARY KEY,
+            link_title TEXT,
+            link_description TEXT,
+            link_image TEXT,
+            link_site_name TEXT,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+    ],
 }
 
 def apply_migrations(conn, current_version: int, target_version: int):
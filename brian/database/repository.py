@@ -1,14 +1,16 @@
 """
 Repository layer for database operations
 """
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime
+import hashlib
+import sqlite3
 
 from .connection import Database
 from ..models import (
     KnowledgeItem, Tag, Connection, ItemType, 
     Region, RegionType, 
-    RegionProfile, ContextStrategy, PROFILE_TEMPLATES,
+    RegionProfile, PROFILE_TEMPLATES,
     Project, DEFAULT_PROJECT_ID
 )
 
@@ -18,6 +20,18 @@ class KnowledgeRepository:
     
     def __init__(self, db: Database):
         self.db = db
+        self._columns = None  # knowledge_items column names, see _item_columns()
+        self._has_fts5 = False  # Set once the knowledge_search table has been seen
+    
+    def version(self) -> tuple:
+        """
+        Cheap change marker for caches built over knowledge items.
+        
+        Delegates to Database.change_version(), so writes from any code on
+        this connection (cascading deletes, restores) and from other
+        processes (e.g. the web app) are all noticed.
+        """
+        return self.db.change_version()
     
     def create(self, item: KnowledgeItem) -> KnowledgeItem:
         """Create a new knowledge item"""
@@ -110,10 +124,27 @@ class KnowledgeRepository:
                 offset: int = 0,
                 sort_by: str = "created_at",
                 sort_order: str = "DESC",
-                project_id: Optional[str] = None) -> List[KnowledgeItem]:
-        """Get all knowledge items with optional filtering"""
+                project_id: Optional[str] = None,
+                content_max_len: Optional[int] = None) -> List[KnowledgeItem]:
+        """Get all knowledge items with optional filtering
+        
+        With content_max_len, content is truncated in SQL (so long bodies are
+        never copied out of SQLite) and "..." is appended where it was cut.
+        Such items are read-only previews; don't pass them to update().
+        """
+        
+        if content_max_len is not None and content_max_len <= 0:
+            content_max_len = None  # Same as get_knowledge_context: 0 or less means full content
         
-        query = "SELECT * FROM knowledge_items WHERE 1=1"
+        if content_max_len:
+            columns = ", ".join(
+                f"substr(content, 1, {int(content_max_len)}) AS content, length(content) AS content_length"
+                if col == "content" else col
+                for col in self._item_columns()
+            )
+            query = f"SELECT {columns} FROM knowledge_items WHERE 1=1"
+        else:
+            query = "SELECT * FROM knowledge_items WHERE 1=1"
         params = []
         
         if item_type:
@@ -144,10 +175,98 @@ class KnowledgeRepository:
         items = []
         for row in rows:
             tags = self._get_tags_for_item(row['id'])
-            items.append(KnowledgeItem.from_db_row(dict(row), tags))
+            item = KnowledgeItem.from_db_row(dict(row), tags)
+            if content_max_len and row['content_length'] > content_max_len:
+                item.content += "..."
+            items.append(item)
         
         return items
     
+    def _item_columns(self) -> List[str]:
+        """Column names of knowledge_items, in table order (looked up once)"""
+        if self._columns is None:
+            rows = self.db.fetchall("PRAGMA table_info(knowledge_items)")
+            self._columns = [row['name'] for row in rows]
+        return self._columns
+    
+    def find_id_by_title(self, title: str, item_type: Optional[ItemType] = None) -> Optional[str]:
+        """ID of an item with exactly this title (and type, if given), or None"""
+        query = "SELECT id FROM knowledge_items WHERE title = ?"
+        params = [title]
+        if item_type:
+            query += " AND item_type = ?"
+            params.append(item_type.value)
+        row = self.db.fetchone(query + " LIMIT 1", tuple(params))
+        return row['id'] if row else None
+    
+    def get_by_ids(self, item_ids: List[str]) -> List[KnowledgeItem]:
+        """Get several knowledge items by ID (unknown IDs are skipped)"""
+        ids = list(dict.fromkeys(item_ids))
+        items = []
+        # Chunk to stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.db.fetchall(
+                f"SELECT * FROM knowledge_items WHERE id IN ({placeholders})",
+                tuple(chunk)
+            )
+            tags_by_item = self._get_tags_for_items(chunk)
+            items.extend(
+                KnowledgeItem.from_db_row(dict(row), tags_by_item.get(row['id'], []))
+                for row in rows
+            )
+        return items
+    
+    def get_all_for_similarity(self, project_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """
+        Get the {id, title, content, tags} dicts the similarity service needs.
+        
+        Same ordering and default limit as get_all(), but selects only those
+        columns, skips model construction and loads tags in one query.
+        """
+        where = "WHERE project_id = ?" if project_id else ""
+        params = (project_id, limit) if project_id else (limit,)
+        subquery = f"SELECT id FROM knowledge_items {where} ORDER BY created_at DESC LIMIT ?"
+        
+        rows = self.db.fetchall(
+            f"SELECT id, title, content FROM knowledge_items {where} ORDER BY created_at DESC LIMIT ?",
+            params
+        )
+        tag_rows = self.db.fetchall(f"""
+            SELECT it.item_id, t.name FROM item_tags it
+            JOIN tags t ON t.id = it.tag_id
+            WHERE it.item_id IN ({subquery})
+        """, params)
+        
+        items = [{
+            'id': row['id'],
+            'title': row['title'],
+            'content': row['content'],
+            'tags': []
+        } for row in rows]
+        by_id = {item['id']: item for item in items}
+        for row in tag_rows:
+            item = by_id.get(row['item_id'])
+            if item is not None:
+                item['tags'].append(row['name'])
+        return items
+    
+    def get_distinct_tags(self, project_id: Optional[str] = None) -> List[str]:
+        """Get the sorted names of all tags attached to at least one item"""
+        query = """
+            SELECT DISTINCT t.name FROM tags t
+            JOIN item_tags it ON t.id = it.tag_id
+        """
+        params = ()
+        if project_id:
+            query += " JOIN knowledge_items ki ON ki.id = it.item_id WHERE ki.project_id = ?"
+            params = (project_id,)
+        query += " ORDER BY t.name"
+        
+        rows = self.db.fetchall(query, params)
+        return [row['name'] for row in rows]
+    
     def update(self, item: KnowledgeItem) -> KnowledgeItem:
         """Update a knowledge item"""
         query = """
@@ -186,31 +305,31 @@ class KnowledgeRepository:
         cursor = self.db.execute(query, (item_id,))
         return cursor.rowcount > 0
     
-    def search(self, query_text: str, limit: int = 50, project_id: Optional[str] = None) -> List[KnowledgeItem]:
+    def search(self, query_text: str, limit: int = 50, project_id: Optional[str] = None,
+               item_type: Optional[ItemType] = None) -> List[KnowledgeItem]:
         """Full-text search across knowledge items.
         
         Uses FTS5 when available, falls back to LIKE-based search otherwise.
         """
         if self._fts5_available():
-            return self._search_fts5(query_text, limit, project_id)
+            return self._search_fts5(query_text, limit, project_id, item_type)
         else:
-            return self._search_like(query_text, limit, project_id)
+            return self._search_like(query_text, limit, project_id, item_type)
 
     def _fts5_available(self) -> bool:
         """Check if the FTS5 virtual table exists and is usable."""
+        if self._has_fts5:
+            return True
         try:
-            import sqlite3
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
+            result = self.db.fetchone(
                 "SELECT name FROM sqlite_master WHERE type='table' AND name='knowledge_search'"
             )
-            result = cursor.fetchone()
-            conn.close()
-            return result is not None
         except Exception:
             return False
-
+        # Tables aren't dropped at runtime, so only a miss needs re-checking
+        self._has_fts5 = result is not None
+        return self._has_fts5
+    
     @staticmethod
     def _sanitize_fts5_query(query_text: str) -> str:
         """
@@ -235,92 +354,102 @@ class KnowledgeRepository:
         # e.g. "MCP server setup" → "MCP* OR server* OR setup*"
         return ' OR '.join(f'{t}*' for t in tokens)
 
-    def _search_fts5(self, query_text: str, limit: int = 50, project_id: Optional[str] = None) -> List[KnowledgeItem]:
-        """Full-text search using FTS5 virtual table."""
-        import sqlite3
-        
-        # Create a fresh connection for FTS queries to avoid the initialize() issue
-        conn = sqlite3.connect(self.db.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    @staticmethod
+    def _search_filters(project_id: Optional[str], item_type: Optional[ItemType], alias: str = "") -> tuple:
+        """SQL conditions (each prefixed with AND) and params for the optional search filters"""
+        sql, params = "", []
+        if project_id:
+            sql += f" AND {alias}project_id = ?"
+            params.append(project_id)
+        if item_type:
+            sql += f" AND {alias}item_type = ?"
+            params.append(item_type.value)
+        return sql, params
+
+    def _fts5_ranked_ids(self, query_text: str, limit: int, project_id: Optional[str] = None,
+                         item_type: Optional[ItemType] = None) -> List[str]:
+        """Ids of the best FTS5 matches, best first; empty if none match or the query is rejected."""
+        cursor = self.db.fts_connection().cursor()
         
         # Sanitize query for FTS5 — use OR + prefix matching for better recall
         fts_query_text = self._sanitize_fts5_query(query_text)
         
-        fts_query = """
-            SELECT id, rank 
-            FROM knowledge_search 
-            WHERE knowledge_search MATCH ? 
-            ORDER BY rank
+        # Filter inside the ranked query so LIMIT counts only matching items
+        filter_sql, filter_params = self._search_filters(project_id, item_type, alias="ki.")
+        fts_query = f"""
+            SELECT ki.id
+            FROM knowledge_search
+            JOIN knowledge_items ki ON ki.rowid = knowledge_search.rowid
+            WHERE knowledge_search MATCH ?{filter_sql}
+            ORDER BY knowledge_search.rank
             LIMIT ?
         """
         try:
-            cursor.execute(fts_query, (fts_query_text, limit))
-            fts_rows = cursor.fetchall()
+            cursor.execute(fts_query, (fts_query_text, *filter_params, limit))
+            return [row['id'] for row in cursor.fetchall()]
         except sqlite3.OperationalError:
-            # If the sanitized query still fails, fall back to LIKE search
-            conn.close()
-            return self._search_like(query_text, limit, project_id)
+            # The sanitized query still failed; callers fall back to LIKE search
+            return []
         finally:
-            conn.close()
+            cursor.close()
+    
+    def _search_fts5(self, query_text: str, limit: int = 50, project_id: Optional[str] = None,
+                     item_type: Optional[ItemType] = None) -> List[KnowledgeItem]:
+        """Full-text search using FTS5 virtual table."""
+        item_ids = self._fts5_ranked_ids(query_text, limit, project_id, item_type)
         
-        if not fts_rows:
+        if not item_ids:
             # FTS5 returned nothing — fall back to LIKE search for broader matching
-            return self._search_like(query_text, limit, project_id)
-        
-        item_ids = [row['id'] for row in fts_rows]
-        placeholders = ','.join('?' * len(item_ids))
-        
-        if project_id:
-            items_query = f"""
-                SELECT * FROM knowledge_items 
-                WHERE id IN ({placeholders}) AND project_id = ?
-            """
-            rows = self.db.fetchall(items_query, tuple(item_ids) + (project_id,))
-        else:
-            items_query = f"""
-                SELECT * FROM knowledge_items 
-                WHERE id IN ({placeholders})
-            """
-            rows = self.db.fetchall(items_query, tuple(item_ids))
-        
-        rank_map = {row['id']: idx for idx, row in enumerate(fts_rows)}
-        
-        items = []
-        for row in rows:
-            tags = self._get_tags_for_item(row['id'])
-            items.append(KnowledgeItem.from_db_row(dict(row), tags))
+            return self._search_like(query_text, limit, project_id, item_type)
         
-        items.sort(key=lambda item: rank_map.get(item.id, 999))
+        items = self.get_by_ids(item_ids)
+        rank_map = {item_id: idx for idx, item_id in enumerate(item_ids)}
+        items.sort(key=lambda item: rank_map[item.id])
         return items
 
-    def _search_like(self, query_text: str, limit: int = 50, project_id: Optional[str] = None) -> List[KnowledgeItem]:
-        """Fallback search using LIKE when FTS5 is unavailable."""
+    def _like_query(self, columns: str, query_text: str, limit: int, project_id: Optional[str],
+                    item_type: Optional[ItemType]) -> tuple:
+        """LIKE search over title and content, most recently updated first"""
         like_pattern = f"%{query_text}%"
+        filter_sql, filter_params = self._search_filters(project_id, item_type)
+        query = f"""
+            SELECT {columns} FROM knowledge_items
+            WHERE (title LIKE ? OR content LIKE ?){filter_sql}
+            ORDER BY updated_at DESC
+            LIMIT ?
+        """
+        return query, (like_pattern, like_pattern, *filter_params, limit)
+
+    def _search_like(self, query_text: str, limit: int = 50, project_id: Optional[str] = None,
+                     item_type: Optional[ItemType] = None) -> List[KnowledgeItem]:
+        """Fallback search using LIKE when FTS5 is unavailable."""
+        rows = self.db.fetchall(*self._like_query("*", query_text, limit, project_id, item_type))
         
-        if project_id:
-            query = """
-                SELECT * FROM knowledge_items
-                WHERE (title LIKE ? OR content LIKE ?) AND project_id = ?
-                ORDER BY updated_at DESC
-                LIMIT ?
-            """
-            rows = self.db.fetchall(query, (like_pattern, like_pattern, project_id, limit))
+        tags_by_item = self._get_tags_for_items([row['id'] for row in rows])
+        return [KnowledgeItem.from_db_row(dict(row), tags_by_item.get(row['id'], [])) for row in rows]
+    
+    def search_titles(self, query_text: str, limit: int = 50, project_id: Optional[str] = None,
+                      item_type: Optional[ItemType] = None) -> List[Tuple[str, str]]:
+        """
+        Same matching and order as search(), but returns only (id, title)
+        pairs, for callers that never look at content, tags or metadata.
+        """
+        if self._fts5_available():
+            item_ids = self._fts5_ranked_ids(query_text, limit, project_id, item_type)
         else:
-            query = """
-                SELECT * FROM knowledge_items
-                WHERE title LIKE ? OR content LIKE ?
-                ORDER BY updated_at DESC
-                LIMIT ?
-            """
-            rows = self.db.fetchall(query, (like_pattern, like_pattern, limit))
+            item_ids = []
         
-        items = []
-        for row in rows:
-            tags = self._get_tags_for_item(row['id'])
-            items.append(KnowledgeItem.from_db_row(dict(row), tags))
+        if item_ids:
+            placeholders = ','.join('?' * len(item_ids))
+            rows = self.db.fetchall(
+                f"SELECT id, title FROM knowledge_items WHERE id IN ({placeholders})", tuple(item_ids)
+            )
+            rank_map = {item_id: idx for idx, item_id in enumerate(item_ids)}
+            return sorted(((row['id'], row['title']) for row in rows), key=lambda pair: rank_map[pair[0]])
         
-        return items
+        # No FTS5 (or no FTS5 match): same LIKE search as _search_like()
+        rows = self.db.fetchall(*self._like_query("id, title", query_text, limit, project_id, item_type))
+        return [(row['id'], row['title']) for row in rows]
     
     def toggle_favorite(self, item_id: str) -> bool:
         """Toggle favorite status"""
@@ -374,6 +503,21 @@ class KnowledgeRepository:
         rows = self.db.fetchall(query, (item_id,))
         return [row['name'] for row in rows]
     
+    def _get_tags_for_items(self, item_ids: List[str]) -> Dict[str, List[str]]:
+        """Get tags for several items in one query, keyed by item ID"""
+        if not item_ids:
+            return {}
+        placeholders = ",".join("?" * len(item_ids))
+        query = f"""
+            SELECT it.item_id, t.name FROM tags t
+            JOIN item_tags it ON t.id = it.tag_id
+            WHERE it.item_id IN ({placeholders})
+        """
+        tags_by_item: Dict[str, List[str]] = {}
+        for row in self.db.fetchall(query, tuple(item_ids)):
+            tags_by_item.setdefault(row['item_id'], []).append(row['name'])
+        return tags_by_item
+    
     def _add_tags_to_item(self, item_id: str, tags: List[str]):
         """Add tags to an item"""
         for tag_name in tags:
@@ -433,6 +577,44 @@ class TagRepository:
         return [dict(row) for row in rows]
 
 
+class LinkMetadataCacheRepository:
+    """Repository for cached link preview metadata, keyed by URL hash"""
+    
+    FIELDS = ('link_title', 'link_description', 'link_image', 'link_site_name')
+    
+    def __init__(self, db: Database):
+        self.db = db
+    
+    @staticmethod
+    def _url_hash(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+    
+    def get(self, url: str, max_age_days: int = 7) -> Optional[Dict[str, Optional[str]]]:
+        """Get cached metadata for a URL if it was fetched within max_age_days"""
+        query = """
+            SELECT link_title, link_description, link_image, link_site_name
+            FROM link_metadata_cache
+            WHERE url_hash = ? AND fetched_at > datetime('now', ?)
+        """
+        row = self.db.fetchone(query, (self._url_hash(url), f"-{max_age_days} days"))
+        return dict(row) if row else None
+    
+    def set(self, url: str, metadata: Dict[str, Optional[str]]):
+        """Store (or refresh) the metadata fetched for a URL"""
+        query = """
+            INSERT INTO link_metadata_cache
+                (url_hash, link_title, link_description, link_image, link_site_name, fetched_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(url_hash) DO UPDATE SET
+                link_title = excluded.link_title,
+                link_description = excluded.link_description,
+                link_image = excluded.link_image,
+                link_site_name = excluded.link_site_name,
+                fetched_at = excluded.fetched_at
+        """
+        self.db.execute(query, (self._url_hash(url),) + tuple(metadata.get(f) for f in self.FIELDS))
+
+
 class ConnectionRepository:
     """Repository for knowledge graph connections"""
     
@@ -673,15 +855,19 @@ class RegionRepository:
         rows = self.db.fetchall(query, (region_id,))
         return [row['item_id'] for row in rows]
     
-    def get_items_with_details(self, region_id: str) -> List[KnowledgeItem]:
-        """Get full item details for all items in a region"""
+    def get_items_with_details(self, region_id: str, limit: Optional[int] = None) -> List[KnowledgeItem]:
+        """Get full item details for all items in a region (newest first, at most limit)"""
         query = """
             SELECT ki.* FROM knowledge_items ki
             JOIN region_items ri ON ki.id = ri.item_id
             WHERE ri.region_id = ?
             ORDER BY ki.created_at DESC
         """
-        rows = self.db.fetchall(query, (region_id,))
+        params = [region_id]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self.db.fetchall(query, tuple(params))
         
         items = []
         for row in rows:
@@ -697,6 +883,49 @@ class RegionRepository:
         
         return items
     
+    def get_items_by_region_batch(self, region_ids: List[str]) -> Dict[str, List[KnowledgeItem]]:
+        """
+        Get full item details for several regions at once.
+        
+        Same result as calling get_items_with_details() per region, but with
+        one query for the items and one for their tags. Every requested
+        region gets an entry, empty if it has no items.
+        """
+        items_by_region: Dict[str, List[KnowledgeItem]] = {region_id: [] for region_id in region_ids}
+        if not region_ids:
+            return items_by_region
+        
+        placeholders = ",".join("?" * len(region_ids))
+        rows = self.db.fetchall(f"""
+            SELECT ri.region_id, ki.* FROM knowledge_items ki
+            JOIN region_items ri ON ki.id = ri.item_id
+            WHERE ri.region_id IN ({placeholders})
+            ORDER BY ki.created_at DESC
+        """, tuple(region_ids))
+        
+        tag_rows = self.db.fetchall(f"""
+            SELECT DISTINCT it.item_id, t.name FROM tags t
+            JOIN item_tags it ON t.id = it.tag_id
+            JOIN region_items ri ON ri.item_id = it.item_id
+            WHERE ri.region_id IN ({placeholders})
+        """, tuple(region_ids))
+        tags_by_item: Dict[str, List[str]] = {}
+        for row in tag_rows:
+            tags_by_item.setdefault(row['item_id'], []).append(row['name'])
+        
+        # Items shared between regions are built once
+        items_by_id: Dict[str, KnowledgeItem] = {}
+        for row in rows:
+            item = items_by_id.get(row['id'])
+            if item is None:
+                data = dict(row)
+                data.pop('region_id')
+                item = KnowledgeItem.from_db_row(data, tags_by_item.get(row['id'], []))
+                items_by_id[item.id] = item
+            items_by_region[row['region_id']].append(item)
+        
+        return items_by_region
+    
     def get_profile(self, region_id: str) -> Optional[RegionProfile]:
         """Get the profile assigned to a region"""
         query = """
@@ -739,7 +968,7 @@ class RegionProfileRepository:
             profile.model_name,
             profile.temperature,
             profile.system_prompt,
-            profile.context_strategy.value if isinstance(profile.context_strategy, ContextStrategy) else profile.context_strategy,
+            profile.context_strategy.value,
             profile.max_context_items,
             profile.tools_config,
             profile.recipe_path,
@@ -785,7 +1014,7 @@ class RegionProfileRepository:
             profile.model_name,
             profile.temperature,
             profile.system_prompt,
-            profile.context_strategy.value if isinstance(profile.context_strategy, ContextStrategy) else profile.context_strategy,
+            profile.context_strategy.value,
             profile.max_context_items,
             profile.tools_config,
             profile.recipe_path,
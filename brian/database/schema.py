@@ -2,7 +2,7 @@
 Database schema for brian - inspired by Goose's SQLite architecture
 """
 
-SCHEMA_VERSION = 8  # FTS: item_id->id, remove tags (not in content table)
+SCHEMA_VERSION = 9  # link_metadata_cache: fetched link previews keyed by URL hash
 
 # Schema creation SQL statements
 SCHEMA_SQL = """
@@ -94,6 +94,16 @@ CREATE TABLE IF NOT EXISTS link_metadata (
     FOREIGN KEY (item_id) REFERENCES knowledge_items(id) ON DELETE CASCADE
 );
 
+-- Fetched link previews, keyed by sha256(url), so re-importing a URL skips the fetch
+CREATE TABLE IF NOT EXISTS link_metadata_cache (
+    url_hash TEXT PRIMARY KEY,
+    link_title TEXT,
+    link_description TEXT,
+    link_image TEXT,
+    link_site_name TEXT,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Region profiles - reusable configuration templates for AI behavior
 CREATE TABLE IF NOT EXISTS region_profiles (
     id TEXT PRIMARY KEY,  -- UUID
@@ -5,6 +5,7 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional, List
 from enum import Enum
+import sys
 import uuid
 
 
@@ -38,6 +39,9 @@ class ContextStrategy(str, Enum):
 # Default project ID for migration compatibility
 DEFAULT_PROJECT_ID = "00000000-0000-0000-0000-000000000001"
 
+# dataclass(slots=True) needs Python 3.10+; older interpreters get a plain dataclass
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 
 @dataclass
 class Project:
@@ -110,9 +114,12 @@ class Project:
         )
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class KnowledgeItem:
-    """A single knowledge item in brian"""
+    """A single knowledge item in brian
+    
+    Slotted so bulk loads (repo.get_all) don't carry a per-instance __dict__.
+    """
     
     title: str
     content: str
@@ -139,13 +146,21 @@ class KnowledgeItem:
     # Skill-specific metadata (JSON string when stored in DB)
     skill_metadata: Optional[dict] = None  # For SKILL type: {name, description, license, source_url, source_commit, bundled_resources}
     
+    def __post_init__(self):
+        # Normalize once so readers can always use item_type.value and
+        # iterate tags without a None check
+        if not isinstance(self.item_type, ItemType):
+            self.item_type = ItemType(self.item_type)
+        if self.tags is None:
+            self.tags = []
+    
     def to_dict(self) -> dict:
         """Convert to dictionary for JSON serialization"""
         return {
             "id": self.id,
             "title": self.title,
             "content": self.content,
-            "item_type": self.item_type.value if isinstance(self.item_type, ItemType) else self.item_type,
+            "item_type": self.item_type.value,
             "url": self.url,
             "language": self.language,
             "favorite": self.favorite,
@@ -203,7 +218,7 @@ class KnowledgeItem:
             created_at=datetime.fromisoformat(row['created_at']) if row.get('created_at') else None,
             updated_at=datetime.fromisoformat(row['updated_at']) if row.get('updated_at') else None,
             accessed_at=datetime.fromisoformat(row['accessed_at']) if row.get('accessed_at') else None,
-            tags=tags or [],
+            tags=tags,
             link_title=row.get('link_title'),
             link_description=row.get('link_description'),
             link_image=row.get('link_image'),
@@ -299,6 +314,11 @@ class Region:
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     
+    def __post_init__(self):
+        # Never None, so callers can len()/iterate item_ids directly
+        if self.item_ids is None:
+            self.item_ids = []
+    
     def to_dict(self) -> dict:
         """Convert to dictionary for JSON serialization"""
         return {
@@ -345,7 +365,7 @@ class Region:
             region_type=RegionType(row['region_type']) if row.get('region_type') else RegionType.MANUAL,
             bounds_json=row.get('bounds_json'),
             is_visible=bool(row.get('is_visible', True)),
-            item_ids=item_ids or [],
+            item_ids=item_ids,
             profile_id=row.get('profile_id'),
             project_id=row.get('project_id'),
             created_at=datetime.fromisoformat(row['created_at']) if row.get('created_at') else None,
@@ -391,6 +411,11 @@ class RegionProfile:
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     
+    def __post_init__(self):
+        # Normalize once so readers can always use context_strategy.value
+        if not isinstance(self.context_strategy, ContextStrategy):
+            self.context_strategy = ContextStrategy(self.context_strategy)
+    
     def to_dict(self) -> dict:
         """Convert to dictionary for JSON serialization"""
         return {
@@ -401,7 +426,7 @@ class RegionProfile:
             "model_name": self.model_name,
             "temperature": self.temperature,
             "system_prompt": self.system_prompt,
-            "context_strategy": self.context_strategy.value if isinstance(self.context_strategy, ContextStrategy) else self.context_strategy,
+            "context_strategy": self.context_strategy.value,
             "max_context_items": self.max_context_items,
             "tools_config": self.tools_config,
             "recipe_path": self.recipe_path,
@@ -419,10 +444,6 @@ class RegionProfile:
             if data.get(date_field) and isinstance(data[date_field], str):
                 data[date_field] = datetime.fromisoformat(data[date_field])
         
-        # Convert context_strategy string to enum
-        if 'context_strategy' in data and isinstance(data['context_strategy'], str):
-            data['context_strategy'] = ContextStrategy(data['context_strategy'])
-        
         return cls(**data)
     
     @classmethod
@@ -0,0 +1,61 @@
+"""
+Optional Numba kernels for the similarity service
+
+Importing this module raises ImportError when numba isn't installed; callers
+import it lazily and fall back to NumPy.
+"""
+import numpy as np
+from numba import njit, prange, types
+
+
+@njit('f4[:,:](f4[:,::1], i8, i8)', fastmath=True, parallel=True, cache=True)
+def cosine_rows(matrix, start, stop):
+    """Cosine similarity of rows start..stop against every row, for L2-normalized rows"""
+    n, dim = matrix.shape
+    out = np.empty((stop - start, n), dtype=np.float32)
+    for r in prange(stop - start):
+        i = start + r
+        for j in range(n):
+            acc = np.float32(0.0)
+            for k in range(dim):
+                acc += matrix[i, k] * matrix[j, k]
+            out[r, j] = acc
+    return out
+
+
+# Compiled eagerly for the exact dtypes _build_csr() produces (all arrays
+# C-contiguous), so there is no type inference or dispatch on first call
+@njit(
+    'f8[::1](i8[::1], i4[::1], f8[::1], f8[::1], i4[::1], f8[::1], f8)',
+    fastmath=True, parallel=True, cache=True, boundscheck=False,
+    locals={'dot': types.float64, 'i': types.int64, 'j': types.int64},
+)
+def score_sparse(doc_offsets, doc_terms, doc_weights, doc_norms, query_terms, query_weights, query_norm):
+    """
+    Cosine similarity of one sparse query vector against every row of a
+    CSR-style TF-IDF matrix. Term ids are sorted within each row and in the
+    query, so each dot product is a merge-style intersection.
+    """
+    n_docs = doc_offsets.shape[0] - 1
+    n_query = query_terms.shape[0]
+    out = np.zeros(n_docs, dtype=np.float64)
+    for d in prange(n_docs):
+        if doc_norms[d] == 0.0:
+            continue
+        i = doc_offsets[d]
+        end = doc_offsets[d + 1]
+        j = 0
+        dot = 0.0
+        while i < end and j < n_query:
+            a = doc_terms[i]
+            b = query_terms[j]
+            if a == b:
+                dot += doc_weights[i] * query_weights[j]
+                i += 1
+                j += 1
+            elif a < b:
+                i += 1
+            else:
+                j += 1
+        out[d] = dot / (doc_norms[d] * query_norm)
+    return out
@@ -7,11 +7,17 @@ Supports two backends:
 
 Use create_similarity_service() to auto-select the best available backend.
 """
-from typing import List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional
+from pathlib import Path
 import re
 import math
+import heapq
+import hashlib
 import os
-from collections import Counter, defaultdict
+import pickle
+import sys
+import threading
+from collections import Counter, OrderedDict, defaultdict
 
 
 def create_similarity_service(force_backend: Optional[str] = None) -> "SimilarityService":
@@ -39,9 +45,90 @@ def create_similarity_service(force_backend: Optional[str] = None) -> "Similarit
     return SimilarityService()
 
 
+# Rows per block in _cosine_row_blocks: 256 x N float32 stays ~10 MB at 10k items
+COSINE_BLOCK_ROWS = 256
+
+
+def _cosine_row_blocks(matrix, block_rows: int = COSINE_BLOCK_ROWS):
+    """
+    Yield (start, block) where block holds the cosine similarities of rows
+    start..start+len(block) against every row, for L2-normalized rows.
+    
+    Memory is O(block_rows x N) instead of the full N x N matrix. Uses the
+    parallel Numba kernel when numba is installed, otherwise NumPy matmuls.
+    """
+    import numpy as np
+    
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    try:
+        from ._numba_kernels import cosine_rows
+    except ImportError:
+        cosine_rows = None
+    
+    n = matrix.shape[0]
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        if cosine_rows is not None:
+            yield start, cosine_rows(matrix, start, stop)
+        else:
+            yield start, matrix[start:stop] @ matrix.T
+
+
+_UNSET = object()
+_score_sparse = _UNSET
+
+
+def _load_score_kernel():
+    """The Numba sparse scoring kernel, or None without numpy/numba (checked once)"""
+    global _score_sparse
+    if _score_sparse is _UNSET:
+        try:
+            from ._numba_kernels import score_sparse
+        except ImportError:
+            score_sparse = None
+        _score_sparse = score_sparse
+    return _score_sparse
+
+
+class _ItemMemo:
+    """
+    Thread-safe LRU of item id -> (text digest, value).
+    
+    Shared by a service and its scoped() copies; bounded so entries for
+    deleted or long-unused items age out of a long-running process.
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, item_id: str, digest: bytes) -> Optional[Any]:
+        """The value memoized for item_id, or None if missing or its text changed"""
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if entry is None or entry[0] != digest:
+                return None
+            self._entries.move_to_end(item_id)
+            return entry[1]
+    
+    def set(self, item_id: str, digest: bytes, value: Any):
+        with self._lock:
+            self._entries[item_id] = (digest, value)
+            self._entries.move_to_end(item_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 class SimilarityService:
     """Service for computing content similarity between knowledge items"""
     
+    # Items whose tokens (and embeddings) are memoized across index builds
+    MEMO_MAX_ITEMS = 20000
+    
     # Common English stop words to filter out
     STOP_WORDS = {
         'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from',
@@ -58,6 +145,30 @@ class SimilarityService:
         self.documents = []
         self.idf_scores = {}
         self.tf_idf_vectors = []
+        self._indexed_items = None  # The exact list the current index was built from
+        self._id_to_row = {}  # item id -> position in the current index
+        self._norms = []  # L2 norm of each TF-IDF vector
+        self._csr = None  # Lazily built CSR arrays of tf_idf_vectors for the Numba kernel
+        self._index_lock = threading.RLock()  # One rebuild at a time; concurrent callers reuse it
+        self.cache_dir: Optional[Path] = None  # Set to persist built indexes across restarts
+        # item id -> (text digest, tokens); shared with scoped() services so each
+        # item's text is tokenized once until it changes, not on every index build
+        self._token_memo = _ItemMemo(self.MEMO_MAX_ITEMS)
+    
+    @staticmethod
+    def _text_digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+    
+    def _document_tokens(self, item: Dict) -> List[str]:
+        """Tokens of an item's title, content and tags, memoized by item id"""
+        # Combine title, content, and tags for richer similarity
+        text = f"{item['title']} {item['content']} {' '.join(item.get('tags', []))}"
+        digest = self._text_digest(text)
+        tokens = self._token_memo.get(item['id'], digest)
+        if tokens is None:
+            tokens = self.tokenize(text)
+            self._token_memo.set(item['id'], digest, tokens)
+        return tokens
     
     def tokenize(self, text: str) -> List[str]:
         """Tokenize and clean text"""
@@ -132,14 +243,13 @@ class SimilarityService:
     
     def build_index(self, items: List[Dict]) -> None:
         """Build TF-IDF index for all items"""
+        self._indexed_items = items
+        self._id_to_row = {item['id']: i for i, item in enumerate(items)}
         self.documents = []
         
         # Tokenize all documents
         for item in items:
-            # Combine title, content, and tags for richer similarity
-            text = f"{item['title']} {item['content']} {' '.join(item.get('tags', []))}"
-            tokens = self.tokenize(text)
-            self.documents.append(tokens)
+            self.documents.append(self._document_tokens(item))
         
         # Compute IDF scores
         self.idf_scores = self.compute_idf(self.documents)
@@ -150,6 +260,101 @@ class SimilarityService:
             tf = self.compute_tf(tokens)
             tf_idf = self.compute_tf_idf(tf, self.idf_scores)
             self.tf_idf_vectors.append(tf_idf)
+        
+        self._norms = [math.sqrt(sum(val ** 2 for val in vec.values())) for vec in self.tf_idf_vectors]
+        self._csr = None
+    
+    def ensure_index(self, items: List[Dict]) -> None:
+        """
+        Build the index unless it was already built from this same list object.
+        
+        When cache_dir is set, an index previously built from identical items
+        is loaded from disk instead, and fresh builds are written back.
+        """
+        with self._index_lock:
+            if items is self._indexed_items:
+                return
+            if self.cache_dir is None:
+                self.build_index(items)
+                return
+            
+            path = Path(self.cache_dir) / f"similarity-{self.index_fingerprint(items)}.pkl"
+            if not self._load_index(path, items):
+                self.build_index(items)
+                self._save_index(path)
+    
+    # Bump when the pickled index layout changes
+    INDEX_FORMAT = 1
+    # Most recent on-disk indexes kept by _save_index (one per project scope, roughly)
+    MAX_CACHED_INDEXES = 4
+    
+    def index_fingerprint(self, items: List[Dict]) -> str:
+        """Content hash of everything build_index() reads, plus the backend identity"""
+        h = hashlib.blake2b(f"{self._backend_id()}:{self.INDEX_FORMAT}".encode(), digest_size=16)
+        for item in items:
+            for part in (item['id'], item['title'], item['content'], *item.get('tags', [])):
+                h.update(part.encode('utf-8', 'surrogatepass'))
+                h.update(b'\x1f')
+            h.update(b'\x1e')
+        return h.hexdigest()
+    
+    def _backend_id(self) -> str:
+        return "tfidf"
+    
+    def _index_state(self) -> Dict:
+        """The built index, minus the items themselves"""
+        return {
+            'idf_scores': self.idf_scores,
+            'tf_idf_vectors': self.tf_idf_vectors,
+            'norms': self._norms,
+        }
+    
+    def _restore_index_state(self, state: Dict, items: List[Dict]) -> None:
+        self._indexed_items = items
+        self._id_to_row = {item['id']: i for i, item in enumerate(items)}
+        self.documents = []  # Tokens aren't persisted; nothing reads them after build_index
+        self.idf_scores = state['idf_scores']
+        self.tf_idf_vectors = state['tf_idf_vectors']
+        self._norms = state['norms']
+        self._csr = None
+    
+    def _load_index(self, path: Path, items: List[Dict]) -> bool:
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            self._restore_index_state(state, items)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable similarity index cache {path}: {e}", file=sys.stderr)
+            return False
+        os.utime(path)  # Mark as recently used for pruning
+        return True
+    
+    def _save_index(self, path: Path) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            with open(tmp, 'wb') as f:
+                pickle.dump(self._index_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+            
+            cached = sorted(path.parent.glob("similarity-*.pkl"), key=lambda p: p.stat().st_mtime, reverse=True)
+            for old in cached[self.MAX_CACHED_INDEXES:]:
+                old.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"Warning: Could not persist similarity index to {path}: {e}", file=sys.stderr)
+    
+    def scoped(self) -> "SimilarityService":
+        """
+        A fresh service of the same backend with its own empty index.
+        
+        Use it to score an ad-hoc subset of items (e.g. one region) without
+        replacing the shared knowledge-base index this service holds.
+        """
+        other = SimilarityService()
+        other._token_memo = self._token_memo
+        return other
     
     def find_similar_items(
         self, 
@@ -171,8 +376,8 @@ class SimilarityService:
         if len(items) < 2:
             return []
         
-        # Build TF-IDF index
-        self.build_index(items)
+        # Build TF-IDF index (reused if already built from this list)
+        self.ensure_index(items)
         
         connections = []
         
@@ -232,6 +437,129 @@ class SimilarityService:
         
         return self.cosine_similarity(vec1, vec2)
     
+    def get_similarity_vector(self, target_item: Dict, items: List[Dict]) -> List[float]:
+        """
+        Similarity of target_item to every entry of items, in order.
+        
+        Reuses the indexed TF-IDF vectors and their precomputed norms, so this
+        is one pass over the index instead of re-tokenizing both sides of every
+        pair as repeated get_similarity_score() calls would.
+        """
+        self.ensure_index(items)
+        
+        target_idx = self._id_to_row.get(target_item['id'])
+        if target_idx is not None:
+            target_vec = self.tf_idf_vectors[target_idx]
+            target_norm = self._norms[target_idx]
+        elif self.idf_scores:
+            # Not indexed (e.g. a query pseudo-item): vectorize it once against
+            # the index's IDF, as get_similarity_score() would for every pair
+            text = f"{target_item['title']} {target_item['content']} {' '.join(target_item.get('tags', []))}"
+            target_vec = self.compute_tf_idf(self.compute_tf(self.tokenize(text)), self.idf_scores)
+            target_norm = math.sqrt(sum(val ** 2 for val in target_vec.values()))
+        else:
+            return [self.get_similarity_score(target_item, item) for item in items]
+        
+        if target_norm == 0:
+            return [0.0] * len(items)
+        
+        kernel = _load_score_kernel()
+        if kernel is not None:
+            return self._score_with_kernel(kernel, target_vec, target_norm)
+        
+        scores = []
+        for vec, norm in zip(self.tf_idf_vectors, self._norms):
+            if norm == 0:
+                scores.append(0.0)
+                continue
+            # Iterate over the smaller vector's terms
+            small, large = (vec, target_vec) if len(vec) < len(target_vec) else (target_vec, vec)
+            dot = sum(val * large[term] for term, val in small.items() if term in large)
+            scores.append(dot / (target_norm * norm))
+        return scores
+    
+    def score_query(self, query: str) -> List[float]:
+        """Similarity of a free-text query to every indexed item, in index order"""
+        query_item = {'id': '__query__', 'title': query, 'content': query, 'tags': []}
+        return self.get_similarity_vector(query_item, self._indexed_items or [])
+    
+    def _build_csr(self):
+        """Pack tf_idf_vectors into (vocab, offsets, term ids, weights, norms) arrays"""
+        import numpy as np
+        
+        vocab = {term: i for i, term in enumerate(self.idf_scores)}
+        offsets = np.zeros(len(self.tf_idf_vectors) + 1, dtype=np.int64)
+        terms, weights = [], []
+        for row, vec in enumerate(self.tf_idf_vectors):
+            entries = sorted((vocab[term], val) for term, val in vec.items() if term in vocab)
+            terms.extend(t for t, _ in entries)
+            weights.extend(v for _, v in entries)
+            offsets[row + 1] = len(terms)
+        return (
+            vocab,
+            offsets,
+            np.asarray(terms, dtype=np.int32),
+            np.asarray(weights, dtype=np.float64),
+            np.asarray(self._norms, dtype=np.float64),
+        )
+    
+    def _score_with_kernel(self, kernel, target_vec: Dict[str, float], target_norm: float) -> List[float]:
+        import numpy as np
+        
+        if self._csr is None:
+            self._csr = self._build_csr()
+        vocab, offsets, terms, weights, norms = self._csr
+        
+        query = sorted((vocab[term], val) for term, val in target_vec.items() if term in vocab)
+        query_terms = np.asarray([t for t, _ in query], dtype=np.int32)
+        query_weights = np.asarray([v for _, v in query], dtype=np.float64)
+        return kernel(offsets, terms, weights, norms, query_terms, query_weights, target_norm).tolist()
+    
+    @staticmethod
+    def _top_related(
+        all_items: List[Dict],
+        scores,
+        exclude_idx: Optional[int],
+        top_k: int,
+        threshold: float
+    ) -> List[Tuple[Dict, float]]:
+        """Pick the top_k (item, score) pairs at or above threshold, skipping exclude_idx"""
+        candidates = [
+            (all_items[i], round(float(score), 3))
+            for i, score in enumerate(scores)
+            if i != exclude_idx and score >= threshold
+        ]
+        return heapq.nlargest(top_k, candidates, key=lambda x: x[1])
+    
+    def get_related_items_batch(
+        self,
+        seed_items: List[Dict],
+        all_items: List[Dict],
+        top_k: int = 5,
+        threshold: float = 0.1
+    ) -> List[List[Tuple[Dict, float]]]:
+        """
+        get_related_items() for several seeds sharing one index build
+        
+        Returns:
+            One list of (item, similarity_score) tuples per seed, in seed order.
+            Seeds that aren't in the index get an empty list.
+        """
+        if not all_items:
+            return [[] for _ in seed_items]
+        
+        self.ensure_index(all_items)
+        
+        results = []
+        for seed in seed_items:
+            seed_idx = self._id_to_row.get(seed['id'])
+            if seed_idx is None:
+                results.append([])
+                continue
+            scores = self.get_similarity_vector(seed, all_items)
+            results.append(self._top_related(all_items, scores, seed_idx, top_k, threshold))
+        return results
+    
     def get_related_items(
         self,
         target_item: Dict,
@@ -248,15 +576,11 @@ class SimilarityService:
         if not all_items:
             return []
         
-        # Build index for all items
-        self.build_index(all_items)
+        # Build index for all items (reused when the caller already built it)
+        self.ensure_index(all_items)
         
         # Find target item index
-        target_idx = None
-        for i, item in enumerate(all_items):
-            if item['id'] == target_item['id']:
-                target_idx = i
-                break
+        target_idx = self._id_to_row.get(target_item['id'])
         
         if target_idx is None:
             return []
@@ -308,6 +632,8 @@ class EmbeddingSimilarityService(SimilarityService):
         self._model = None  # Lazy-loaded
         self._embeddings = []  # numpy array after build_index
         self._items_cache = []  # items corresponding to embeddings
+        # item id -> (text digest, embedding), shared with scoped() services
+        self._embedding_memo = _ItemMemo(self.MEMO_MAX_ITEMS)
     
     @property
     def model(self):
@@ -317,6 +643,27 @@ class EmbeddingSimilarityService(SimilarityService):
             self._model = SentenceTransformer(self._model_name)
         return self._model
     
+    def _backend_id(self) -> str:
+        return f"embedding:{self._model_name}"
+    
+    def _index_state(self) -> Dict:
+        state = super()._index_state()
+        state['embeddings'] = self._embeddings
+        return state
+    
+    def _restore_index_state(self, state: Dict, items: List[Dict]) -> None:
+        super()._restore_index_state(state, items)
+        self._items_cache = items
+        self._embeddings = state['embeddings']
+    
+    def scoped(self) -> "EmbeddingSimilarityService":
+        """A fresh embedding service sharing this one's loaded model"""
+        other = EmbeddingSimilarityService(self._model_name)
+        other._model = self.model
+        other._token_memo = self._token_memo
+        other._embedding_memo = self._embedding_memo
+        return other
+    
     @staticmethod
     def _item_to_text(item: Dict) -> str:
         """Convert an item dict to a single text string for embedding."""
@@ -346,12 +693,23 @@ class EmbeddingSimilarityService(SimilarityService):
             self._embeddings = np.array([])
             return
         
-        # Encode all texts in one batch (much faster than one-by-one)
-        self._embeddings = self.model.encode(
-            texts,
-            show_progress_bar=False,
-            normalize_embeddings=True,  # Pre-normalize for fast cosine sim
-        )
+        # Only encode items whose text is new or changed since it was last embedded
+        digests = [self._text_digest(text) for text in texts]
+        vectors = [self._embedding_memo.get(item['id'], digest) for item, digest in zip(items, digests)]
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+        
+        if missing:
+            # Encode all new texts in one batch (much faster than one-by-one)
+            encoded = self.model.encode(
+                [texts[i] for i in missing],
+                show_progress_bar=False,
+                normalize_embeddings=True,  # Pre-normalize for fast cosine sim
+            )
+            for i, vec in zip(missing, encoded):
+                vectors[i] = vec
+                self._embedding_memo.set(items[i]['id'], digests[i], vec)
+        
+        self._embeddings = np.stack(vectors)
     
     def _embedding_cosine_similarity(self, idx1: int, idx2: int) -> float:
         """Fast cosine similarity between two pre-normalized embeddings."""
@@ -381,22 +739,38 @@ class EmbeddingSimilarityService(SimilarityService):
         if len(items) < 2:
             return []
         
-        self.build_index(items)
+        import numpy as np
+        
+        self.ensure_index(items)
         
         connections = []
-        for i in range(len(items)):
-            item_connections = []
-            for j in range(i + 1, len(items)):
-                similarity = self._embedding_cosine_similarity(i, j)
-                if similarity >= threshold:
-                    item_connections.append({
+        # Row blocks of the similarity matrix; only each row's top hits are kept
+        for start, block in _cosine_row_blocks(self._embeddings):
+            for offset, row in enumerate(block):
+                i = start + offset
+                later = row[i + 1:]
+                hits = np.nonzero(later >= threshold)[0]
+                k = max_connections_per_item
+                if 0 < k < len(hits):
+                    # Narrow to the k best plus anything that could tie them
+                    # once rounded to 3 places
+                    scores = later[hits]
+                    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+                    hits = hits[scores >= kth - 0.001]
+                # Rank on the rounded score, ties in index order, as the
+                # reported similarity is the rounded one
+                ranked = sorted(
+                    ((round(float(later[h]), 3), h + i + 1) for h in hits),
+                    key=lambda pair: pair[0],
+                    reverse=True
+                )
+                for similarity, j in ranked[:max_connections_per_item]:
+                    connections.append({
                         'source_item_id': items[i]['id'],
                         'target_item_id': items[j]['id'],
-                        'similarity': round(similarity, 3),
+                        'similarity': similarity,
                         'connection_type': 'semantic_similarity'
                     })
-            item_connections.sort(key=lambda x: x['similarity'], reverse=True)
-            connections.extend(item_connections[:max_connections_per_item])
         
         return connections
     
@@ -404,8 +778,8 @@ class EmbeddingSimilarityService(SimilarityService):
         """Get embedding similarity between two items."""
         # If we have a pre-built index, try to find both items in it
         if len(self._embeddings) > 0 and self._items_cache:
-            idx1 = next((i for i, it in enumerate(self._items_cache) if it['id'] == item1['id']), None)
-            idx2 = next((i for i, it in enumerate(self._items_cache) if it['id'] == item2['id']), None)
+            idx1 = self._id_to_row.get(item1['id'])
+            idx2 = self._id_to_row.get(item2['id'])
             if idx1 is not None and idx2 is not None:
                 return self._embedding_cosine_similarity(idx1, idx2)
         
@@ -415,6 +789,60 @@ class EmbeddingSimilarityService(SimilarityService):
         embeddings = self.model.encode(texts, show_progress_bar=False, normalize_embeddings=True)
         return float(np.dot(embeddings[0], embeddings[1]))
     
+    def get_similarity_vector(self, target_item: Dict, items: List[Dict]) -> List[float]:
+        """Embedding similarity of target_item to every entry of items, as one matrix-vector product."""
+        import numpy as np
+        
+        if not items:
+            return []
+        
+        self.ensure_index(items)
+        
+        target_idx = self._id_to_row.get(target_item['id'])
+        if target_idx is None:
+            target_emb = self.model.encode(
+                [self._item_to_text(target_item)], show_progress_bar=False, normalize_embeddings=True
+            )[0]
+        else:
+            target_emb = self._embeddings[target_idx]
+        
+        return np.asarray(self._embeddings @ target_emb).tolist()
+    
+    def get_related_items_batch(
+        self,
+        seed_items: List[Dict],
+        all_items: List[Dict],
+        top_k: int = 5,
+        threshold: float = 0.1
+    ) -> List[List[Tuple[Dict, float]]]:
+        """Related items for several seeds from a single seeds x items matrix product."""
+        import numpy as np
+        
+        if not all_items or not seed_items:
+            return [[] for _ in seed_items]
+        
+        self.ensure_index(all_items)
+        
+        seed_rows = [self._id_to_row.get(seed['id']) for seed in seed_items]
+        missing = [seed for seed, row in zip(seed_items, seed_rows) if row is None]
+        if missing:
+            # Seeds outside the index (e.g. query pseudo-items) are encoded in one batch
+            encoded = iter(self.model.encode(
+                [self._item_to_text(seed) for seed in missing],
+                show_progress_bar=False,
+                normalize_embeddings=True,
+            ))
+        seed_matrix = np.stack([
+            self._embeddings[row] if row is not None else next(encoded)
+            for row in seed_rows
+        ])
+        
+        scores = seed_matrix @ self._embeddings.T
+        return [
+            self._top_related(all_items, row_scores, row, top_k, threshold)
+            for row_scores, row in zip(scores, seed_rows)
+        ]
+    
     def get_related_items(
         self,
         target_item: Dict,
@@ -426,13 +854,10 @@ class EmbeddingSimilarityService(SimilarityService):
         if not all_items:
             return []
         
-        self.build_index(all_items)
+        self.ensure_index(all_items)
         
         # Find target in index
-        target_idx = next(
-            (i for i, item in enumerate(all_items) if item['id'] == target_item['id']),
-            None
-        )
+        target_idx = self._id_to_row.get(target_item['id'])
         
         # If target not in index (e.g. a query pseudo-item), encode it separately
         if target_idx is None:
@@ -1,11 +1,11 @@
 """
 Skills Importer - Fetch and import skills from Anthropic's skills repository
 """
-import json
 import re
+import threading
 from typing import Optional, List, Dict, Any
-from urllib.request import urlopen, Request
-from urllib.error import HTTPError, URLError
+
+import requests
 
 # GitHub API configuration
 GITHUB_API_BASE = "https://api.github.com"
@@ -20,6 +20,27 @@ class SkillImportError(Exception):
     pass
 
 
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """
+    Shared HTTP session, so repeated GitHub requests reuse pooled keep-alive
+    connections instead of paying a TCP + TLS handshake each time.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers["User-Agent"] = "Brian-Skills-Importer/1.0"
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=20)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
 def parse_yaml_frontmatter(content: str) -> tuple[Dict[str, Any], str]:
     """
     Parse YAML frontmatter from markdown content.
@@ -72,18 +93,21 @@ def fetch_github_api(endpoint: str, github_token: Optional[str] = None) -> Any:
     url = f"{GITHUB_API_BASE}{endpoint}"
     headers = {
         "Accept": "application/vnd.github.v3+json",
-        "User-Agent": "Brian-Skills-Importer/1.0"
     }
     
     if github_token:
         headers["Authorization"] = f"token {github_token}"
     
     try:
-        req = Request(url, headers=headers)
-        with urlopen(req, timeout=30) as response:
-            return json.loads(response.read().decode('utf-8'))
-    except HTTPError as e:
-        if e.code == 403:
+        response = _get_session().get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        try:
+            return response.json()
+        except requests.JSONDecodeError as e:
+            # Handled here: it also subclasses RequestException
+            raise SkillImportError(f"Failed to parse GitHub API response: {e}")
+    except requests.HTTPError as e:
+        if e.response.status_code == 403:
             # Check if it's a rate limit error
             raise SkillImportError(
                 f"GitHub API rate limit exceeded. "
@@ -91,10 +115,8 @@ def fetch_github_api(endpoint: str, github_token: Optional[str] = None) -> Any:
                 f"Error: {e}"
             )
         raise SkillImportError(f"GitHub API request failed: {e}")
-    except URLError as e:
+    except requests.RequestException as e:
         raise SkillImportError(f"Network error: {e}")
-    except json.JSONDecodeError as e:
-        raise SkillImportError(f"Failed to parse GitHub API response: {e}")
 
 
 def fetch_raw_file(repo: str, branch: str, path: str) -> str:
@@ -115,12 +137,16 @@ def fetch_raw_file(repo: str, branch: str, path: str) -> str:
     url = f"{GITHUB_RAW_BASE}/{repo}/{branch}/{path}"
     
     try:
-        req = Request(url, headers={"User-Agent": "Brian-Skills-Importer/1.0"})
-        with urlopen(req, timeout=30) as response:
-            return response.read().decode('utf-8')
-    except HTTPError as e:
+        response = _get_session().get(url, timeout=30)
+        response.raise_for_status()
+        response.encoding = 'utf-8'
+        return response.text
+    except requests.HTTPError as e:
         raise SkillImportError(f"Failed to fetch {path}: {e}")
-    except URLError as e:
+    except requests.exceptions.ContentDecodingError as e:
+        # Before RequestException, which it subclasses: a bad body, not the network
+        raise SkillImportError(f"Failed to decode {path}: {e}")
+    except requests.RequestException as e:
         raise SkillImportError(f"Network error fetching {path}: {e}")
 
 
@@ -7,9 +7,14 @@ Allows AI assistants to search, create, and connect knowledge items.
 """
 
 import asyncio
+import hashlib
+import heapq
 import json
 import os
 import sys
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any, Optional
 
@@ -17,7 +22,7 @@ from typing import Any, Optional
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from brian.database.connection import Database
-from brian.database.repository import KnowledgeRepository, RegionRepository, RegionProfileRepository, ProjectRepository, ConnectionRepository
+from brian.database.repository import KnowledgeRepository, RegionRepository, RegionProfileRepository, ProjectRepository, ConnectionRepository, LinkMetadataCacheRepository
 from brian.services.similarity import SimilarityService, create_similarity_service
 from brian.services.link_preview import fetch_link_metadata, is_google_doc
 from brian.models.knowledge_item import KnowledgeItem, ItemType, Region, RegionType, RegionProfile, ContextStrategy, PROFILE_TEMPLATES, Project, DEFAULT_PROJECT_ID, Connection
@@ -39,6 +44,11 @@ from mcp.types import (
     ServerResult,
 )
 
+try:
+    import orjson
+except ImportError:  # optional: _dumps falls back to the stdlib encoder
+    orjson = None
+
 # Initialize server
 server = Server("brian-knowledge")
 
@@ -48,12 +58,15 @@ region_repo: Optional[RegionRepository] = None
 profile_repo: Optional[RegionProfileRepository] = None
 project_repo: Optional[ProjectRepository] = None
 conn_repo: Optional[ConnectionRepository] = None
-similarity_service: Optional[SimilarityService] = None
+link_cache: Optional[LinkMetadataCacheRepository] = None
+similarity_service: Optional[SimilarityService] = None  # Created on first use, see get_similarity_service()
+similarity_cache_dir: Optional[Path] = None
+_similarity_lock = threading.Lock()
 
 
 def init_services():
     """Initialize database connection and services"""
-    global repo, region_repo, profile_repo, project_repo, conn_repo, similarity_service
+    global repo, region_repo, profile_repo, project_repo, conn_repo, link_cache, similarity_cache_dir
     db_path = os.path.expanduser("~/.brian/brian.db")
     db = Database(db_path)
     # Don't call initialize() - it breaks FTS queries in autocommit mode
@@ -63,7 +76,454 @@ def init_services():
     profile_repo = RegionProfileRepository(db)
     project_repo = ProjectRepository(db)
     conn_repo = ConnectionRepository(db)
-    similarity_service = create_similarity_service()
+    link_cache = LinkMetadataCacheRepository(db)
+    # Persist built indexes so a restart can skip the first full rebuild
+    similarity_cache_dir = Path(db_path).parent / "cache"
+
+
+def get_similarity_service() -> SimilarityService:
+    """
+    The shared similarity service, created on first use.
+    
+    Picking the backend can import sentence-transformers (and torch), which
+    clients that only use CRUD tools should never pay for at startup.
+    """
+    global similarity_service
+    if similarity_service is None:
+        with _similarity_lock:
+            if similarity_service is None:
+                service = create_similarity_service()
+                service.cache_dir = similarity_cache_dir
+                similarity_service = service
+    return similarity_service
+
+
+class IndexCache:
+    """
+    Caches the similarity-service input for each project scope.
+    
+    Entries are tagged with repo.version(), so any item write (from this
+    server or from the web app) triggers a rebuild on the next lookup.
+    Returning the same list object on hits also lets the similarity service
+    skip re-indexing via ensure_index().
+    
+    Only the {id, title, content, tags} projection is loaded up front; full
+    KnowledgeItems are fetched on demand through get_items() and memoized
+    alongside the entry. Each entry also owns its own similarity index (see
+    get_scorer()), so alternating between scopes never rebuilds one.
+    """
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.RLock()
+    
+    def _entry(self, project_id: Optional[str], repo: KnowledgeRepository) -> dict:
+        version = repo.version()
+        entry = self._entries.get(project_id)
+        if entry is None or entry['version'] != version:
+            items_dict = repo.get_all_for_similarity(project_id=project_id)
+            entry = {
+                'version': version,
+                'items_dict': items_dict,
+                'dict_by_id': {d['id']: d for d in items_dict},
+                'full_items': {},
+                'scorer': None,
+            }
+            self._entries[project_id] = entry
+        return entry
+    
+    def get_or_build(self, project_id: Optional[str], repo: KnowledgeRepository):
+        """
+        Return (items_dict, dict_by_id) for the given project (None = all
+        projects). dict_by_id gives O(1) lookups of an item's similarity dict.
+        """
+        with self._lock:
+            entry = self._entry(project_id, repo)
+            return entry['items_dict'], entry['dict_by_id']
+    
+    def get_scorer(self, project_id: Optional[str], repo: KnowledgeRepository) -> SimilarityService:
+        """
+        Return a similarity service indexed over this scope's items_dict.
+        
+        The index is built once per (scope, version) and kept with the entry.
+        """
+        with self._lock:
+            entry = self._entry(project_id, repo)
+            if entry['scorer'] is None:
+                scorer = get_similarity_service().scoped()
+                scorer.cache_dir = similarity_cache_dir
+                entry['scorer'] = scorer
+            scorer, items_dict = entry['scorer'], entry['items_dict']
+        # Outside our lock: the service serializes builds with its own lock
+        scorer.ensure_index(items_dict)
+        return scorer
+    
+    def get_items(self, project_id: Optional[str], repo: KnowledgeRepository, item_ids: list[str]) -> dict[str, KnowledgeItem]:
+        """Return full KnowledgeItems for item_ids, keyed by ID, fetching only uncached ones"""
+        with self._lock:
+            full_items = self._entry(project_id, repo)['full_items']
+            missing = [item_id for item_id in item_ids if item_id not in full_items]
+            if missing:
+                for item in repo.get_by_ids(missing):
+                    full_items[item.id] = item
+            return {item_id: full_items[item_id] for item_id in item_ids if item_id in full_items}
+    
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+
+index_cache = IndexCache()
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with TTL for serialized tool responses (and other
+    read-mostly values, such as skill listings).
+    
+    Callers include repo.version() in the key, so entries written before a
+    change to the knowledge base are never served again and simply age out.
+    """
+    
+    def __init__(self, max_size: int = 128, ttl_seconds: float = 300.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+    
+    def get(self, key) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            value, expires_at = entry
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+    
+    def set(self, key, value: Any):
+        """Store value under key, evicting the least recently used entry if full"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+    
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+    
+    def get_cache_stats(self) -> dict:
+        """Return hit/miss/eviction counters"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / total, 3) if total else 0.0,
+            }
+
+
+query_cache = QueryCache()
+
+
+class ScopedIndexCache:
+    """
+    LRU of similarity indexes built over one region's or project's items.
+    
+    Keyed by (scope, items version), where the version hashes each item's id
+    and updated_at in order, so membership changes and item edits get a fresh
+    index without explicit invalidation.
+    """
+    
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+    
+    @staticmethod
+    def _version_key(items: list[KnowledgeItem]) -> str:
+        h = hashlib.blake2b(digest_size=8)
+        for item in items:
+            h.update(f"{item.id}:{item.updated_at}\n".encode())
+        return h.hexdigest()
+    
+    def get_scorer(self, scope: str, items: list[KnowledgeItem]) -> SimilarityService:
+        """Return a similarity service indexed over items, in the same order"""
+        key = (scope, self._version_key(items))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            
+            # The item dicts are only needed to build the index; the service
+            # keeps them, so callers score by position against items directly
+            
+            items_dict = [{
+                'id': item.id,
+                'title': item.title,
+                'content': item.content,
+                'tags': item.tags
+            } for item in items]
+            scorer = get_similarity_service().scoped()
+            scorer.build_index(items_dict)
+            
+            self._entries[key] = scorer
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return scorer
+    
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+
+scoped_index_cache = ScopedIndexCache()
+
+
+def _rank_items_by_query(
+    scope: str,
+    items: list[KnowledgeItem],
+    query: Optional[str],
+    limit: int
+) -> list[KnowledgeItem]:
+    """
+    The `limit` items most similar to query, best first, or the first `limit`
+    items when there is no query. scope names the item set (e.g.
+    "region:<id>") so its index is cached without touching the shared one.
+    """
+    if not query or not items:
+        return items[:limit]
+    
+    scores = scoped_index_cache.get_scorer(scope, items).score_query(query)
+    
+    # Partial selection, no full sort
+    top = heapq.nlargest(limit, range(len(items)), key=scores.__getitem__)
+    return [items[i] for i in top]
+
+
+# GitHub skill listings and fetched skills change rarely; keep them for 10 minutes
+skill_cache = QueryCache(max_size=256, ttl_seconds=600.0)
+
+
+def _dumps(obj: Any) -> str:
+    """
+    Serialize a tool/resource payload as compact JSON (via orjson when installed).
+    
+    Non-string dict keys, numpy arrays/scalars and datetimes are accepted on
+    both paths; the stdlib fallback stringifies anything it can't encode.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+            default=_json_default,
+        ).decode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+
+def _json_default(obj: Any):
+    """Fallback encoder for values the JSON serializers don't handle natively"""
+    if hasattr(obj, "tolist"):  # numpy arrays and scalars
+        return obj.tolist()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _build_term_index(items: list[KnowledgeItem]) -> tuple[dict[str, set[str]], dict[str, set[str]]]:
+    """
+    Build inverted indexes over items: lowercased title word -> item ids and
+    lowercased tag -> item ids.
+    """
+    title_index: dict[str, set[str]] = {}
+    tag_index: dict[str, set[str]] = {}
+    for item in items:
+        for word in item.title.lower().split():
+            title_index.setdefault(word, set()).add(item.id)
+        for tag in item.tags:
+            tag_index.setdefault(tag.lower(), set()).add(item.id)
+    return title_index, tag_index
+
+
+def _term_hits(index: dict[str, set[str]], term: str) -> set[str]:
+    """
+    Ids of items with an index key containing term. A whitespace-free term is
+    a substring of a title iff it is a substring of one of its words, so this
+    matches the plain `term in title.lower()` check.
+    """
+    hits: set[str] = set()
+    for key, item_ids in index.items():
+        if term in key:
+            hits |= item_ids
+    return hits
+
+
+# suggest_profile keyword hints per template, matched as substrings of the
+# lowercased query (so "debugging" counts for "debug" and "how to" can match)
+_PROFILE_KEYWORDS = {
+    "code_assistant": ("code", "programming", "function", "debug", "implement", "api", "bug", "syntax", "error"),
+    "research_mode": ("research", "analyze", "study", "explore", "investigate", "understand", "compare"),
+    "creative_writing": ("creative", "brainstorm", "idea", "write", "story", "design", "imagine"),
+    "documentation": ("document", "documentation", "explain", "guide", "tutorial", "readme", "how to"),
+}
+
+_UNSET = object()
+_keyword_automaton_cache: Any = _UNSET  # None once we know pyahocorasick is unavailable
+
+
+def _keyword_automaton():
+    """Aho-Corasick automaton over every profile keyword (built once), or None without pyahocorasick"""
+    global _keyword_automaton_cache
+    if _keyword_automaton_cache is _UNSET:
+        try:
+            import ahocorasick
+        except ImportError:
+            _keyword_automaton_cache = None
+        else:
+            automaton = ahocorasick.Automaton()
+            for keywords in _PROFILE_KEYWORDS.values():
+                for kw in keywords:
+                    automaton.add_word(kw, kw)
+            automaton.make_automaton()
+            _keyword_automaton_cache = automaton
+    return _keyword_automaton_cache
+
+
+def _count_profile_keywords(query_lower: str) -> dict[str, int]:
+    """Number of distinct keywords of each profile that occur in the query"""
+    automaton = _keyword_automaton()
+    if automaton is None:
+        return {key: sum(kw in query_lower for kw in keywords) for key, keywords in _PROFILE_KEYWORDS.items()}
+    # One linear scan finds every (possibly overlapping) keyword occurrence
+    found = {kw for _, kw in automaton.iter(query_lower)}
+    return {key: len(found.intersection(keywords)) for key, keywords in _PROFILE_KEYWORDS.items()}
+
+
+# suggest_profile content_type hint -> template it boosts
+_CONTENT_TYPE_PROFILES = {
+    "code": "code_assistant",
+    "research": "research_mode",
+    "creative": "creative_writing",
+    "documentation": "documentation",
+}
+
+
+def _preview(content: str, n: int) -> str:
+    """Truncate content to n characters, marking the cut with an ellipsis"""
+    return content if len(content) <= n else content[:n] + "..."
+
+
+def _token_key(github_token: Optional[str]) -> str:
+    """Short hash of a GitHub token, so raw tokens are never held as cache keys"""
+    if not github_token:
+        return ""
+    return hashlib.blake2b(github_token.encode(), digest_size=8).hexdigest()
+
+
+def _list_available_skills_cached(github_token: Optional[str]) -> list[dict]:
+    """list_available_skills() through skill_cache"""
+    key = (_token_key(github_token), "list")
+    skills = skill_cache.get(key)
+    if skills is None:
+        skills = list_available_skills(github_token)
+        skill_cache.set(key, skills)
+    return skills
+
+
+def _fetch_skill_cached(skill_name: str, github_token: Optional[str]) -> dict:
+    """fetch_skill() through skill_cache"""
+    key = (_token_key(github_token), "get", skill_name)
+    skill_data = skill_cache.get(key)
+    if skill_data is None:
+        skill_data = fetch_skill(skill_name, github_token)
+        skill_cache.set(key, skill_data)
+    return skill_data
+
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-flight
+_background_tasks: set = set()
+
+
+def _spawn_background(coro) -> asyncio.Task:
+    """Run a coroutine without awaiting it, keeping it alive until done"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _cached_link_metadata(url: str) -> Optional[dict]:
+    """Metadata fetched for url within the last week, or None"""
+    try:
+        return link_cache.get(url)
+    except Exception as e:
+        # e.g. the web app hasn't migrated the database to add the cache table yet
+        print(f"Warning: Link metadata cache unavailable: {e}", file=sys.stderr)
+        return None
+
+
+def _store_link_metadata(url: str, metadata: dict):
+    """Cache fetched metadata, skipping the domain-only fallback used when a fetch fails"""
+    if not (metadata.get('link_title') or metadata.get('link_description')):
+        return
+    try:
+        link_cache.set(url, metadata)
+    except Exception as e:
+        print(f"Warning: Could not cache link metadata for {url}: {e}", file=sys.stderr)
+
+
+async def _enrich_link_metadata(item_id: str, url: str):
+    """
+    Fetch link metadata off the event loop and store it on the item.
+    
+    Like the old inline fetch, a fetched title/description replaces the
+    item's title/content when those were left empty or set to the URL.
+    """
+    try:
+        metadata = _cached_link_metadata(url)
+        if metadata is None:
+            metadata = await asyncio.to_thread(fetch_link_metadata, url)
+            _store_link_metadata(url, metadata)
+        
+        item = repo.get_by_id(item_id)
+        if not item:
+            return  # Deleted while we were fetching
+        
+        item.link_title = metadata.get('link_title')
+        item.link_description = metadata.get('link_description')
+        item.link_image = metadata.get('link_image')
+        item.link_site_name = metadata.get('link_site_name')
+        
+        # If title wasn't provided or is generic, use fetched title
+        if metadata.get('link_title') and (not item.title or item.title == url):
+            item.title = metadata['link_title']
+        
+        # If content is empty or just the URL, use fetched description
+        if metadata.get('link_description') and (not item.content or item.content == url):
+            item.content = metadata['link_description']
+        
+        repo.update(item)
+    except Exception as e:
+        # If metadata fetch fails, keep the item without it
+        print(f"Warning: Could not fetch metadata for {url}: {e}", file=sys.stderr)
 
 
 # Load HTML template for item view
@@ -126,7 +586,7 @@ async def handle_read_resource(req: ReadResourceRequest) -> ServerResult:
         stats = {
             "total_items": len(items),
             "by_type": {},
-            "total_tags": len(set(tag for item in items if item.tags for tag in item.tags)),
+            "total_tags": len(set(tag for item in items for tag in item.tags)),
             "favorites": len([i for i in items if i.favorite]),
         }
         
@@ -138,7 +598,7 @@ async def handle_read_resource(req: ReadResourceRequest) -> ServerResult:
             contents=[TextResourceContents(
                 uri=uri_str,
                 mimeType="application/json",
-                text=json.dumps(stats, indent=2)
+                text=_dumps(stats)
             )]
         ))
     
@@ -147,16 +607,17 @@ async def handle_read_resource(req: ReadResourceRequest) -> ServerResult:
         items = repo.get_all()
         connections = []
         
-        # Get similarity connections
-        if similarity_service:
-            sim_connections = similarity_service.find_similar_items(threshold=0.15)
-            for conn in sim_connections:
-                connections.append({
-                    "from_id": conn["item1_id"],
-                    "to_id": conn["item2_id"],
-                    "type": "similarity",
-                    "strength": conn["similarity"]
-                })
+        # Get similarity connections (over the shared, cached index)
+        items_dict, _ = index_cache.get_or_build(None, repo)
+        scorer = index_cache.get_scorer(None, repo)
+        sim_connections = scorer.find_similar_items(items_dict, threshold=0.15)
+        for conn in sim_connections:
+            connections.append({
+                "from_id": conn["source_item_id"],
+                "to_id": conn["target_item_id"],
+                "type": "similarity",
+                "strength": conn["similarity"]
+            })
         
         # Get manual connections (would need to implement in repo)
         graph = {
@@ -168,7 +629,7 @@ async def handle_read_resource(req: ReadResourceRequest) -> ServerResult:
             contents=[TextResourceContents(
                 uri=uri_str,
                 mimeType="application/json",
-                text=json.dumps(graph, indent=2)
+                text=_dumps(graph)
             )]
         ))
     
@@ -181,7 +642,7 @@ async def handle_read_resource(req: ReadResourceRequest) -> ServerResult:
         result = [{
             "id": item.id,
             "title": item.title,
-            "type": str(item.item_type.value) if hasattr(item.item_type, 'value') else str(item.item_type),
+            "type": item.item_type.value,
             "created_at": item.created_at.isoformat() if item.created_at else None,
             "tags": item.tags,
         } for item in recent]
@@ -190,7 +651,7 @@ async def handle_read_resource(req: ReadResourceRequest) -> ServerResult:
             contents=[TextResourceContents(
                 uri=uri_str,
                 mimeType="application/json",
-                text=json.dumps(result, indent=2)
+                text=_dumps(result)
             )]
         ))
     
@@ -432,7 +893,12 @@ For simple web links without document content:
             description="Get a list of all unique tags used in the knowledge base.",
             inputSchema={
                 "type": "object",
-                "properties": {}
+                "properties": {
+                    "project_id": {
+                        "type": "string",
+                        "description": "Optional project ID to only list tags used in that project"
+                    }
+                }
             }
         ),
         Tool(
@@ -501,6 +967,11 @@ For simple web links without document content:
                         "type": "integer",
                         "description": "Maximum number of items to return (default: all)",
                         "default": 50
+                    },
+                    "preview_only": {
+                        "type": "boolean",
+                        "description": "Return 500-character content previews instead of full content (default: false)",
+                        "default": False
                     }
                 },
                 "required": ["region_id"]
@@ -739,6 +1210,11 @@ For simple web links without document content:
                         "type": "integer",
                         "description": "Maximum number of items to return (default: 20)",
                         "default": 20
+                    },
+                    "max_content_length": {
+                        "type": "integer",
+                        "description": "Maximum characters of content to include per item. 0 or null for full content (default: full content)",
+                        "default": 0
                     }
                 }
             }
@@ -941,6 +1417,12 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         project_id = arguments.get("project_id")
         limit = arguments.get("limit", 50)
         
+        # Identical searches against an unchanged knowledge base return the cached response
+        cache_key = ("search_knowledge", query, item_type, project_id, limit, repo.version())
+        cached = query_cache.get(cache_key)
+        if cached is not None:
+            return [TextContent(type="text", text=cached)]
+        
         # First, do full-text search (with optional project scoping)
         text_results = repo.search(query, project_id=project_id)
         
@@ -948,18 +1430,10 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             text_results = [r for r in text_results if r.item_type == item_type]
         
         # If we have text results, enhance with similarity-based related items
-        all_items = repo.get_all(project_id=project_id)
-        
-        # Convert items to dict format for similarity service
-        items_dict = [{
-            'id': item.id,
-            'title': item.title,
-            'content': item.content,
-            'tags': item.tags or []
-        } for item in all_items]
+        items_dict, dict_by_id = index_cache.get_or_build(project_id, repo)
         
-        # Build similarity index
-        similarity_service.build_index(items_dict)
+        # This scope's similarity index (built once per knowledge-base change)
+        scorer = index_cache.get_scorer(project_id, repo)
         
         # Collect results with similarity scores
         results_with_scores = []
@@ -971,8 +1445,8 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
                 results_with_scores.append({
                     "id": item.id,
                     "title": item.title,
-                    "content": item.content[:200] + "..." if len(item.content) > 200 else item.content,
-                    "type": str(item.item_type.value) if hasattr(item.item_type, 'value') else str(item.item_type),
+                    "content": _preview(item.content, 200),
+                    "type": item.item_type.value,
                     "tags": item.tags,
                     "url": item.url,
                     "created_at": item.created_at.isoformat() if item.created_at else None,
@@ -988,30 +1462,31 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             if text_results:
                 # Use top text matches as seeds
                 for item in text_results[:3]:
-                    seed_items.append(next((i for i in items_dict if i['id'] == item.id), None))
+                    seed_items.append(dict_by_id.get(item.id))
                 seed_items = [s for s in seed_items if s is not None]
             
             if not seed_items and items_dict:
                 # No text results — create a pseudo-item from the query and find
                 # the most similar items to it directly
                 query_pseudo = {'id': '__query__', 'title': query, 'content': query, 'tags': []}
-                similar = similarity_service.get_related_items(
+                similar = scorer.get_related_items(
                     query_pseudo,
                     items_dict,
                     top_k=limit,
                     threshold=0.05  # Lower threshold for query-based similarity
                 )
+                full_items = index_cache.get_items(project_id, repo, [i['id'] for i, _ in similar])
                 for similar_item, similarity_score in similar:
                     if similar_item['id'] not in seen_ids and len(results_with_scores) < limit:
-                        full_item = next((i for i in all_items if i.id == similar_item['id']), None)
+                        full_item = full_items.get(similar_item['id'])
                         if full_item:
-                            if item_type and (str(full_item.item_type.value) if hasattr(full_item.item_type, 'value') else str(full_item.item_type)) != item_type:
+                            if item_type and full_item.item_type.value != item_type:
                                 continue
                             results_with_scores.append({
                                 "id": full_item.id,
                                 "title": full_item.title,
-                                "content": full_item.content[:200] + "..." if len(full_item.content) > 200 else full_item.content,
-                                "type": str(full_item.item_type.value) if hasattr(full_item.item_type, 'value') else str(full_item.item_type),
+                                "content": _preview(full_item.content, 200),
+                                "type": full_item.item_type.value,
                                 "tags": full_item.tags,
                                 "url": full_item.url,
                                 "created_at": full_item.created_at.isoformat() if full_item.created_at else None,
@@ -1020,43 +1495,47 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
                             })
                             seen_ids.add(full_item.id)
             
-            for item in text_results[:3]:  # Use top 3 matches as seeds
-                item_dict = next((i for i in items_dict if i['id'] == item.id), None)
-                if item_dict:
-                    # Find similar items
-                    similar = similarity_service.get_related_items(
-                        item_dict, 
-                        items_dict, 
-                        top_k=limit - len(results_with_scores),
-                        threshold=0.15
-                    )
-                    
-                    for similar_item, similarity_score in similar:
-                        if similar_item['id'] not in seen_ids and len(results_with_scores) < limit:
-                            # Get full item details
-                            full_item = next((i for i in all_items if i.id == similar_item['id']), None)
-                            if full_item:
-                                results_with_scores.append({
-                                    "id": full_item.id,
-                                    "title": full_item.title,
-                                    "content": full_item.content[:200] + "..." if len(full_item.content) > 200 else full_item.content,
-                                    "type": str(full_item.item_type.value) if hasattr(full_item.item_type, 'value') else str(full_item.item_type),
-                                    "tags": full_item.tags,
-                                    "url": full_item.url,
-                                    "created_at": full_item.created_at.isoformat() if full_item.created_at else None,
-                                    "relevance": "similar",
-                                    "score": similarity_score
-                                })
-                                seen_ids.add(full_item.id)
+            # Find items similar to the top 3 matches in one batched pass
+            related_per_seed = scorer.get_related_items_batch(
+                seed_items,
+                items_dict,
+                top_k=limit,
+                threshold=0.15
+            ) if seed_items else []
+            full_items = index_cache.get_items(
+                project_id, repo, [i['id'] for similar in related_per_seed for i, _ in similar]
+            )
+            
+            for similar in related_per_seed:
+                for similar_item, similarity_score in similar:
+                    if similar_item['id'] not in seen_ids and len(results_with_scores) < limit:
+                        # Get full item details
+                        full_item = full_items.get(similar_item['id'])
+                        if full_item:
+                            results_with_scores.append({
+                                "id": full_item.id,
+                                "title": full_item.title,
+                                "content": _preview(full_item.content, 200),
+                                "type": full_item.item_type.value,
+                                "tags": full_item.tags,
+                                "url": full_item.url,
+                                "created_at": full_item.created_at.isoformat() if full_item.created_at else None,
+                                "relevance": "similar",
+                                "score": similarity_score
+                            })
+                            seen_ids.add(full_item.id)
         
         response = {
             "count": len(results_with_scores),
             "items": results_with_scores
         }
         
+        text = _dumps(response)
+        query_cache.set(cache_key, text)
+        
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=text
         )]
     
     elif name == "create_knowledge_item":
@@ -1084,30 +1563,6 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
                 "message": "This is a Google Docs URL. Use the Google Drive MCP 'read' tool to fetch the document content automatically."
             }
         
-        # Fetch link metadata if URL is provided and item is a link
-        link_metadata = {}
-        if url and item_type == ItemType.LINK:
-            try:
-                metadata = fetch_link_metadata(url)
-                link_metadata = {
-                    'link_title': metadata.get('link_title'),
-                    'link_description': metadata.get('link_description'),
-                    'link_image': metadata.get('link_image'),
-                    'link_site_name': metadata.get('link_site_name')
-                }
-                
-                # If title wasn't provided or is generic, use fetched title
-                if metadata.get('link_title') and (not title or title == url):
-                    title = metadata['link_title']
-                
-                # If content is empty or just the URL, use fetched description
-                if metadata.get('link_description') and (not content or content == url):
-                    content = metadata['link_description']
-                    
-            except Exception as e:
-                # If metadata fetch fails, continue without it
-                print(f"Warning: Could not fetch metadata for {url}: {e}")
-        
         item = KnowledgeItem(
             title=title,
             content=content,
@@ -1115,13 +1570,18 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             tags=tags,
             url=url,
             language=language,
-            project_id=project_id,
-            **link_metadata
+            project_id=project_id
         )
         
         created_item = repo.create(item)
         
-        item_type_str = str(created_item.item_type.value) if hasattr(created_item.item_type, 'value') else str(created_item.item_type)
+        # Fetch link metadata in the background so a slow site doesn't hold
+        # up the response; the item is updated once the metadata arrives
+        enriching = bool(url and item_type == ItemType.LINK)
+        if enriching:
+            _spawn_background(_enrich_link_metadata(created_item.id, url))
+        
+        item_type_str = created_item.item_type.value
         
         # Return structured content for the MCP App view
         structured_content = {
@@ -1139,6 +1599,8 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         # Build text content
         text_content = "Successfully created the item."
+        if enriching:
+            text_content += " Link metadata is being fetched in the background."
         if google_doc_content:
             text_content += f"\n\nNote: {google_doc_content['message']}"
         
@@ -1162,47 +1624,43 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not target_item:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Item {item_id} not found"})
+                text=_dumps({"error": f"Item {item_id} not found"})
             )]
         
-        # Get all items and convert to dict format
-        all_items = repo.get_all()
-        items_dict = [{
-            'id': item.id,
-            'title': item.title,
-            'content': item.content,
-            'tags': item.tags or []
-        } for item in all_items]
+        # Get all items in dict format
+        items_dict, dict_by_id = index_cache.get_or_build(None, repo)
         
         # Find the target item dict
-        target_dict = next((i for i in items_dict if i['id'] == item_id), None)
+        target_dict = dict_by_id.get(item_id)
         if not target_dict:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Item {item_id} not found in index"})
+                text=_dumps({"error": f"Item {item_id} not found in index"})
             )]
         
         # Find similar items
-        similar = similarity_service.get_related_items(
+        similar = index_cache.get_scorer(None, repo).get_related_items(
             target_dict,
             items_dict,
             top_k=limit,
             threshold=threshold
         )
         
+        full_items = index_cache.get_items(None, repo, [item["id"] for item, _ in similar])
+        
         response = {
             "count": len(similar),
             "similar_items": [{
                 "id": item["id"],
                 "title": item["title"],
                 "similarity": similarity_score,
-                "type": str(next((i.item_type.value for i in all_items if i.id == item["id"]), "unknown")),
+                "type": full_items[item["id"]].item_type.value if item["id"] in full_items else "unknown",
             } for item, similarity_score in similar]
         }
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "get_item_details":
@@ -1212,10 +1670,10 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not item:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Item {item_id} not found"})
+                text=_dumps({"error": f"Item {item_id} not found"})
             )]
         
-        item_type_str = str(item.item_type.value) if hasattr(item.item_type, 'value') else str(item.item_type)
+        item_type_str = item.item_type.value
         
         # Return structured content - the _meta.ui.resourceUri is in the tool definition
         structured_content = {
@@ -1249,67 +1707,62 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         def _truncate_content(content: str) -> str:
             """Truncate content if max_content_length is set, otherwise return full content."""
-            if max_content_length and max_content_length > 0 and len(content) > max_content_length:
-                return content[:max_content_length] + "..."
+            if max_content_length and max_content_length > 0:
+                return _preview(content, max_content_length)
             return content
         
         # Search for the topic
         results = repo.search(topic)
         
         # Get all items for similarity service
-        all_items = repo.get_all()
-        items_dict = [{
-            'id': item.id,
-            'title': item.title,
-            'content': item.content,
-            'tags': item.tags or []
-        } for item in all_items]
-        
-        # Build similarity index
-        similarity_service.build_index(items_dict)
-        
-        # If we have results, also find similar items
+        items_dict, dict_by_id = index_cache.get_or_build(None, repo)
+        
+        # The shared similarity index (built once per knowledge-base change)
+        scorer = index_cache.get_scorer(None, repo)
+        
+        # If we have results, also find similar items (one batched pass for all seeds)
+        top_results = results[:3]  # Top 3 search results
+        seed_dicts = [dict_by_id[item.id] for item in top_results if item.id in dict_by_id]
+        related_by_seed = dict(zip(
+            (seed['id'] for seed in seed_dicts),
+            scorer.get_related_items_batch(seed_dicts, items_dict, top_k=limit, threshold=0.2)
+        ))
+        full_items = index_cache.get_items(
+            None, repo, [i["id"] for related in related_by_seed.values() for i, _ in related]
+        )
+        
         context_items = []
         seen_ids = set()
         
-        for item in results[:3]:  # Top 3 search results
+        for item in top_results:
             if item.id not in seen_ids:
                 context_items.append({
                     "id": item.id,
                     "title": item.title,
                     "content": _truncate_content(item.content),
-                    "type": str(item.item_type.value) if hasattr(item.item_type, 'value') else str(item.item_type),
+                    "type": item.item_type.value,
                     "tags": item.tags,
                     "relevance": "direct_match"
                 })
                 seen_ids.add(item.id)
             
-            # Find similar items using the similarity service
+            # Add its similar items
             if len(context_items) < limit:
-                item_dict = next((i for i in items_dict if i['id'] == item.id), None)
-                if item_dict:
-                    similar = similarity_service.get_related_items(
-                        item_dict, 
-                        items_dict, 
-                        top_k=limit - len(context_items),
-                        threshold=0.2
-                    )
-                    
-                    for similar_item, similarity_score in similar:
-                        if similar_item["id"] not in seen_ids and len(context_items) < limit:
-                            # Get full item details
-                            full_item = next((i for i in all_items if i.id == similar_item["id"]), None)
-                            if full_item:
-                                context_items.append({
-                                    "id": full_item.id,
-                                    "title": full_item.title,
-                                    "content": _truncate_content(full_item.content),
-                                    "type": str(full_item.item_type.value) if hasattr(full_item.item_type, 'value') else str(full_item.item_type),
-                                    "tags": full_item.tags,
-                                    "relevance": "similar",
-                                    "similarity": similarity_score
-                                })
-                                seen_ids.add(full_item.id)
+                for similar_item, similarity_score in related_by_seed.get(item.id, []):
+                    if similar_item["id"] not in seen_ids and len(context_items) < limit:
+                        # Get full item details
+                        full_item = full_items.get(similar_item["id"])
+                        if full_item:
+                            context_items.append({
+                                "id": full_item.id,
+                                "title": full_item.title,
+                                "content": _truncate_content(full_item.content),
+                                "type": full_item.item_type.value,
+                                "tags": full_item.tags,
+                                "relevance": "similar",
+                                "similarity": similarity_score
+                            })
+                            seen_ids.add(full_item.id)
         
         response = {
             "topic": topic,
@@ -1319,7 +1772,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "update_knowledge_item":
@@ -1329,20 +1782,19 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not item:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Item {item_id} not found"})
+                text=_dumps({"error": f"Item {item_id} not found"})
             )]
         
         # Update fields if provided
-        if "title" in arguments:
-            item.title = arguments["title"]
-        if "content" in arguments:
-            item.content = arguments["content"]
-        if "tags" in arguments:
-            item.tags = arguments["tags"]
-        if "url" in arguments:
-            item.url = arguments["url"]
+        changed = False
+        for field in ("title", "content", "tags", "url"):
+            if field in arguments and arguments[field] != getattr(item, field):
+                setattr(item, field, arguments[field])
+                changed = True
         
-        updated_item = repo.update(item)
+        # Re-sending identical values (e.g. rerunning a sync script) skips the
+        # write, so updated_at, the caches and the WAL are left untouched
+        updated_item = repo.update(item) if changed else item
         
         response = {
             "success": True,
@@ -1355,7 +1807,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "delete_knowledge_item":
@@ -1366,12 +1818,12 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not item:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Item {item_id} not found", "success": False})
+                text=_dumps({"error": f"Item {item_id} not found", "success": False})
             )]
         
         # Store item details for confirmation message
         item_title = item.title
-        item_type = item.item_type.value if hasattr(item.item_type, 'value') else str(item.item_type)
+        item_type = item.item_type.value
         
         # Delete the item
         success = repo.delete(item_id)
@@ -1391,25 +1843,20 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "list_all_tags":
-        items = repo.get_all()
-        all_tags = set()
-        
-        for item in items:
-            if item.tags:
-                all_tags.update(item.tags)
+        tags = repo.get_distinct_tags(arguments.get("project_id"))
         
         response = {
-            "count": len(all_tags),
-            "tags": sorted(list(all_tags))
+            "count": len(tags),
+            "tags": tags
         }
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "debug_item_connections":
@@ -1421,60 +1868,54 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not target_item:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Item {item_id} not found"})
+                text=_dumps({"error": f"Item {item_id} not found"})
             )]
         
         # Get all items
-        all_items = repo.get_all()
-        items_dict = [{
-            'id': item.id,
-            'title': item.title,
-            'content': item.content,
-            'tags': item.tags or []
-        } for item in all_items]
+        items_dict, dict_by_id = index_cache.get_or_build(None, repo)
         
         # Find target dict
-        target_dict = next((i for i in items_dict if i['id'] == item_id), None)
+        target_dict = dict_by_id.get(item_id)
         
-        # Build similarity index
-        similarity_service.build_index(items_dict)
+        # The shared similarity index (built once per knowledge-base change)
+        scorer = index_cache.get_scorer(None, repo)
         
-        # Calculate similarity to ALL items
+        # Calculate similarity to ALL items in one pass over the index
+        scores = scorer.get_similarity_vector(target_dict, items_dict)
+        # Collect scores and threshold counts in a single sweep
         all_similarities = []
-        for item_dict in items_dict:
+        above_15 = above_10 = above_5 = 0
+        for item_dict, score in zip(items_dict, scores):
             if item_dict['id'] != item_id:  # Skip self
-                score = similarity_service.get_similarity_score(target_dict, item_dict)
                 all_similarities.append({
                     "id": item_dict["id"],
                     "title": item_dict["title"],
-                    "similarity": round(score, 4),
-                    "above_threshold_0.15": score >= 0.15,
-                    "above_threshold_0.10": score >= 0.10,
-                    "above_threshold_0.05": score >= 0.05
+                    "similarity": round(score, 4)
                 })
+                above_15 += score >= 0.15
+                above_10 += score >= 0.10
+                above_5 += score >= 0.05
         
-        # Sort by similarity
-        all_similarities.sort(key=lambda x: x["similarity"], reverse=True)
-        
-        # Filter if not showing all
-        if not show_all:
-            all_similarities = [s for s in all_similarities if s["similarity"] >= 0.05]
-        
-        # Analysis
-        above_15 = sum(1 for s in all_similarities if s["above_threshold_0.15"])
-        above_10 = sum(1 for s in all_similarities if s["above_threshold_0.10"])
-        above_5 = sum(1 for s in all_similarities if s["above_threshold_0.05"])
+        # Rank by similarity; only the top 20 need ordering unless showing all
+        if show_all:
+            all_similarities.sort(key=lambda x: x["similarity"], reverse=True)
+        else:
+            all_similarities = heapq.nlargest(
+                20,
+                (s for s in all_similarities if s["similarity"] >= 0.05),
+                key=lambda x: x["similarity"]
+            )
         
         response = {
             "item": {
                 "id": target_item.id,
                 "title": target_item.title,
-                "type": str(target_item.item_type.value) if hasattr(target_item.item_type, 'value') else str(target_item.item_type),
+                "type": target_item.item_type.value,
                 "content_length": len(target_item.content),
                 "tags": target_item.tags
             },
             "analysis": {
-                "total_items_in_db": len(all_items) - 1,  # Excluding self
+                "total_items_in_db": len(items_dict) - 1,  # Excluding self
                 "connections_at_threshold_0.15": above_15,
                 "connections_at_threshold_0.10": above_10,
                 "connections_at_threshold_0.05": above_5,
@@ -1482,7 +1923,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
                 "will_show_in_graph": above_15 > 0
             },
             "recommendations": [],
-            "similarity_scores": all_similarities[:20] if not show_all else all_similarities
+            "similarity_scores": all_similarities
         }
         
         # Add recommendations
@@ -1505,7 +1946,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     # Region tool handlers
@@ -1521,7 +1962,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "get_region":
@@ -1531,7 +1972,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not region:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Region {region_id} not found"})
+                text=_dumps({"error": f"Region {region_id} not found"})
             )]
         
         # Get items with details
@@ -1542,57 +1983,36 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             "items": [{
                 "id": item.id,
                 "title": item.title,
-                "type": str(item.item_type.value) if hasattr(item.item_type, 'value') else str(item.item_type),
+                "type": item.item_type.value,
                 "tags": item.tags,
-                "content_preview": item.content[:200] + "..." if len(item.content) > 200 else item.content
+                "content_preview": _preview(item.content, 200)
             } for item in items]
         }
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "get_region_context":
         region_id = arguments["region_id"]
         query = arguments.get("query")
         limit = arguments.get("limit", 50)
+        preview_only = arguments.get("preview_only", False)
         
         region = region_repo.get_by_id(region_id)
         if not region:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Region {region_id} not found"})
+                text=_dumps({"error": f"Region {region_id} not found"})
             )]
         
-        # Get all items in the region with full details
-        items = region_repo.get_items_with_details(region_id)
+        # Get items in the region with full details. Ranking needs all of
+        # them; otherwise only the newest `limit` are read
+        items = region_repo.get_items_with_details(region_id, limit=None if query else limit)
         
         # If query provided, rank items by relevance
-        if query and items:
-            items_dict = [{
-                'id': item.id,
-                'title': item.title,
-                'content': item.content,
-                'tags': item.tags or []
-            } for item in items]
-            
-            # Build index and score items
-            similarity_service.build_index(items_dict)
-            
-            # Create a pseudo-item for the query
-            query_dict = {'id': 'query', 'title': query, 'content': query, 'tags': []}
-            
-            scored_items = []
-            for item, item_dict in zip(items, items_dict):
-                score = similarity_service.get_similarity_score(query_dict, item_dict)
-                scored_items.append((item, score))
-            
-            # Sort by score and limit
-            scored_items.sort(key=lambda x: x[1], reverse=True)
-            items = [item for item, score in scored_items[:limit]]
-        else:
-            items = items[:limit]
+        items = _rank_items_by_query(f"region:{region_id}", items, query, limit)
         
         response = {
             "region": {
@@ -1606,8 +2026,8 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             "items": [{
                 "id": item.id,
                 "title": item.title,
-                "content": item.content,  # Full content for context
-                "type": str(item.item_type.value) if hasattr(item.item_type, 'value') else str(item.item_type),
+                "content": _preview(item.content, 500) if preview_only else item.content,
+                "type": item.item_type.value,
                 "tags": item.tags,
                 "url": item.url
             } for item in items]
@@ -1615,7 +2035,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "suggest_regions":
@@ -1627,34 +2047,43 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not regions:
             return [TextContent(
                 type="text",
-                text=json.dumps({"count": 0, "suggestions": [], "message": "No regions found"})
+                text=_dumps({"count": 0, "suggestions": [], "message": "No regions found"})
             )]
         
         # Score each region by relevance to the query
         scored_regions = []
+        query_lower = query.lower()
+        query_terms = query_lower.split()
+        
+        # Load the items of every region in one round-trip
+        items_by_region = region_repo.get_items_by_region_batch([region.id for region in regions])
+        
+        # Resolve each query term against title/tag indexes once, instead of
+        # re-scanning every item of every region per term
+        distinct_items = {item.id: item for items in items_by_region.values() for item in items}
+        title_index, tag_index = _build_term_index(list(distinct_items.values()))
+        title_hits = {term: _term_hits(title_index, term) for term in query_terms}
+        tag_hits = {term: _term_hits(tag_index, term) for term in query_terms}
         
         for region in regions:
             score = 0.0
             
             # Check name match
-            if query.lower() in region.name.lower():
+            if query_lower in region.name.lower():
                 score += 0.5
             
             # Check description match
-            if region.description and query.lower() in region.description.lower():
+            if region.description and query_lower in region.description.lower():
                 score += 0.3
             
             # Get items and check content relevance
-            items = region_repo.get_items_with_details(region.id)
+            items = items_by_region[region.id]
             if items:
-                # Check if query terms appear in item titles/tags
-                query_terms = query.lower().split()
-                for item in items:
-                    for term in query_terms:
-                        if term in item.title.lower():
-                            score += 0.1
-                        if item.tags and any(term in tag.lower() for tag in item.tags):
-                            score += 0.05
+                # Count items whose titles/tags contain each query term
+                region_item_ids = {item.id for item in items}
+                for term in query_terms:
+                    score += 0.1 * len(title_hits[term] & region_item_ids)
+                    score += 0.05 * len(tag_hits[term] & region_item_ids)
             
             if score > 0:
                 scored_regions.append((region, score, len(items)))
@@ -1677,7 +2106,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "create_region":
@@ -1707,7 +2136,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "add_items_to_region":
@@ -1718,7 +2147,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not region:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Region {region_id} not found"})
+                text=_dumps({"error": f"Region {region_id} not found"})
             )]
         
         region_repo.add_items(region_id, item_ids)
@@ -1734,7 +2163,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     # Profile tool handlers
@@ -1748,7 +2177,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "get_profile_templates":
@@ -1763,7 +2192,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "get_region_profile":
@@ -1773,7 +2202,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not region:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Region {region_id} not found"})
+                text=_dumps({"error": f"Region {region_id} not found"})
             )]
         
         profile = region_repo.get_profile(region_id)
@@ -1794,7 +2223,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "get_context_with_profile":
@@ -1806,7 +2235,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not region:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Region {region_id} not found"})
+                text=_dumps({"error": f"Region {region_id} not found"})
             )]
         
         # Get profile for this region
@@ -1818,30 +2247,11 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         elif limit is None:
             limit = 20  # Default
         
-        # Get items in the region
-        items = region_repo.get_items_with_details(region_id)
+        # Get items in the region (all of them only when they will be ranked)
+        items = region_repo.get_items_with_details(region_id, limit=None if query else limit)
         
         # If query provided, rank items by relevance
-        if query and items:
-            items_dict = [{
-                'id': item.id,
-                'title': item.title,
-                'content': item.content,
-                'tags': item.tags or []
-            } for item in items]
-            
-            similarity_service.build_index(items_dict)
-            query_dict = {'id': 'query', 'title': query, 'content': query, 'tags': []}
-            
-            scored_items = []
-            for item, item_dict in zip(items, items_dict):
-                score = similarity_service.get_similarity_score(query_dict, item_dict)
-                scored_items.append((item, score))
-            
-            scored_items.sort(key=lambda x: x[1], reverse=True)
-            items = [item for item, score in scored_items[:limit]]
-        else:
-            items = items[:limit]
+        items = _rank_items_by_query(f"region:{region_id}", items, query, limit)
         
         # Build response with profile settings
         response = {
@@ -1856,14 +2266,14 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
                 "model_name": profile.model_name if profile else None,
                 "temperature": profile.temperature if profile else 0.7,
                 "system_prompt": profile.system_prompt if profile else None,
-                "context_strategy": profile.context_strategy.value if profile and hasattr(profile.context_strategy, 'value') else "dense_retrieval"
+                "context_strategy": profile.context_strategy.value if profile else "dense_retrieval"
             },
             "item_count": len(items),
             "items": [{
                 "id": item.id,
                 "title": item.title,
                 "content": item.content,
-                "type": str(item.item_type.value) if hasattr(item.item_type, 'value') else str(item.item_type),
+                "type": item.item_type.value,
                 "tags": item.tags,
                 "url": item.url
             } for item in items]
@@ -1871,7 +2281,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "suggest_profile":
@@ -1884,38 +2294,22 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         # Score profiles based on query and content type
         scored_profiles = []
         
-        # Keywords for different profile types
-        code_keywords = ["code", "programming", "function", "debug", "implement", "api", "bug", "syntax", "error"]
-        research_keywords = ["research", "analyze", "study", "explore", "investigate", "understand", "compare"]
-        creative_keywords = ["creative", "brainstorm", "idea", "write", "story", "design", "imagine"]
-        doc_keywords = ["document", "documentation", "explain", "guide", "tutorial", "readme", "how to"]
-        
         query_lower = query.lower()
+        hinted_profile = _CONTENT_TYPE_PROFILES.get(content_type)
+        
+        keyword_counts = _count_profile_keywords(query_lower)
         
         # Score templates
         for key, template in PROFILE_TEMPLATES.items():
             score = 0.0
             
             # Content type hint
-            if content_type:
-                if content_type == "code" and key == "code_assistant":
-                    score += 0.5
-                elif content_type == "research" and key == "research_mode":
-                    score += 0.5
-                elif content_type == "creative" and key == "creative_writing":
-                    score += 0.5
-                elif content_type == "documentation" and key == "documentation":
-                    score += 0.5
+            if key == hinted_profile:
+                score += 0.5
             
             # Keyword matching
-            if key == "code_assistant":
-                score += sum(0.1 for kw in code_keywords if kw in query_lower)
-            elif key == "research_mode":
-                score += sum(0.1 for kw in research_keywords if kw in query_lower)
-            elif key == "creative_writing":
-                score += sum(0.1 for kw in creative_keywords if kw in query_lower)
-            elif key == "documentation":
-                score += sum(0.1 for kw in doc_keywords if kw in query_lower)
+            if key in _PROFILE_KEYWORDS:
+                score += 0.1 * keyword_counts[key]
             elif key == "quick_lookup":
                 if len(query.split()) <= 5:  # Short queries
                     score += 0.2
@@ -1984,7 +2378,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     # Project (Knowledge Base) tool handlers
@@ -2000,7 +2394,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "get_project":
@@ -2010,7 +2404,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not project:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Project {project_id} not found"})
+                text=_dumps({"error": f"Project {project_id} not found"})
             )]
         
         # Get stats for the project
@@ -2023,7 +2417,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "get_current_project":
@@ -2032,7 +2426,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not project:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": "No default project found"})
+                text=_dumps({"error": "No default project found"})
             )]
         
         response = {
@@ -2042,7 +2436,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "create_project":
@@ -2067,7 +2461,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "switch_project":
@@ -2077,7 +2471,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not project:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Project {project_id} not found"})
+                text=_dumps({"error": f"Project {project_id} not found"})
             )]
         
         # Set as default
@@ -2094,13 +2488,14 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     elif name == "get_project_context":
         project_id = arguments.get("project_id")
         query = arguments.get("query")
         limit = arguments.get("limit", 20)
+        max_content_length = arguments.get("max_content_length") or 0
         
         # Use default project if not specified
         if not project_id:
@@ -2110,38 +2505,26 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             else:
                 return [TextContent(
                     type="text",
-                    text=json.dumps({"error": "No project specified and no default project found"})
+                    text=_dumps({"error": "No project specified and no default project found"})
                 )]
         
         project = project_repo.get_by_id(project_id)
         if not project:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Project {project_id} not found"})
+                text=_dumps({"error": f"Project {project_id} not found"})
             )]
         
-        # Get items for this project
-        items = repo.get_all(project_id=project_id, limit=limit)
+        # Get items for this project. Ranking needs full content; otherwise
+        # let SQLite truncate it when only previews were asked for
+        items = repo.get_all(
+            project_id=project_id,
+            limit=limit,
+            content_max_len=max_content_length if not query and max_content_length > 0 else None
+        )
         
         # If query provided, rank items by relevance
-        if query and items:
-            items_dict = [{
-                'id': item.id,
-                'title': item.title,
-                'content': item.content,
-                'tags': item.tags or []
-            } for item in items]
-            
-            similarity_service.build_index(items_dict)
-            query_dict = {'id': 'query', 'title': query, 'content': query, 'tags': []}
-            
-            scored_items = []
-            for item, item_dict in zip(items, items_dict):
-                score = similarity_service.get_similarity_score(query_dict, item_dict)
-                scored_items.append((item, score))
-            
-            scored_items.sort(key=lambda x: x[1], reverse=True)
-            items = [item for item, score in scored_items[:limit]]
+        items = _rank_items_by_query(f"project:{project_id}", items, query, limit)
         
         # Get regions for this project
         regions = region_repo.get_all(project_id=project_id)
@@ -2157,14 +2540,14 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
                 "name": r.name,
                 "description": r.description,
                 "color": r.color,
-                "item_count": len(r.item_ids) if r.item_ids else 0
+                "item_count": len(r.item_ids)
             } for r in regions],
             "item_count": len(items),
             "items": [{
                 "id": item.id,
                 "title": item.title,
-                "content": item.content,
-                "type": str(item.item_type.value) if hasattr(item.item_type, 'value') else str(item.item_type),
+                "content": _preview(item.content, max_content_length) if query and max_content_length > 0 else item.content,
+                "type": item.item_type.value,
                 "tags": item.tags,
                 "url": item.url
             } for item in items]
@@ -2172,7 +2555,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
 
     elif name == "upload_image":
@@ -2198,7 +2581,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         except Exception:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": "Invalid base64 image data"})
+                text=_dumps({"error": "Invalid base64 image data"})
             )]
         
         # Resolve project
@@ -2229,7 +2612,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
 
     elif name == "create_connection":
@@ -2238,12 +2621,12 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not repo.get_by_id(source_id):
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Source item {source_id} not found"})
+                text=_dumps({"error": f"Source item {source_id} not found"})
             )]
         if not repo.get_by_id(target_id):
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Target item {target_id} not found"})
+                text=_dumps({"error": f"Target item {target_id} not found"})
             )]
         connection = Connection(
             source_item_id=source_id,
@@ -2255,7 +2638,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         created = conn_repo.create(connection)
         return [TextContent(
             type="text",
-            text=json.dumps(created.to_dict(), indent=2)
+            text=_dumps(created.to_dict())
         )]
 
     elif name == "get_item_connections":
@@ -2271,7 +2654,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             result.append(d)
         return [TextContent(
             type="text",
-            text=json.dumps(result, indent=2)
+            text=_dumps(result)
         )]
 
     elif name == "update_connection":
@@ -2281,11 +2664,11 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not updated:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Connection {connection_id} not found"})
+                text=_dumps({"error": f"Connection {connection_id} not found"})
             )]
         return [TextContent(
             type="text",
-            text=json.dumps(updated.to_dict(), indent=2)
+            text=_dumps(updated.to_dict())
         )]
 
     elif name == "delete_connection":
@@ -2294,11 +2677,11 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         if not success:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Connection {connection_id} not found"})
+                text=_dumps({"error": f"Connection {connection_id} not found"})
             )]
         return [TextContent(
             type="text",
-            text=json.dumps({"success": True, "deleted": connection_id})
+            text=_dumps({"success": True, "deleted": connection_id})
         )]
     
     # Skills tool handlers
@@ -2306,7 +2689,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         github_token = arguments.get("github_token")
         
         try:
-            skills = list_available_skills(github_token)
+            skills = _list_available_skills_cached(github_token)
             
             response = {
                 "count": len(skills),
@@ -2319,13 +2702,13 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             
             return [TextContent(
                 type="text",
-                text=json.dumps(response, indent=2)
+                text=_dumps(response)
             )]
             
         except SkillImportError as e:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": str(e)})
+                text=_dumps({"error": str(e)})
             )]
     
     elif name == "get_skill":
@@ -2333,7 +2716,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         github_token = arguments.get("github_token")
         
         try:
-            skill_data = fetch_skill(skill_name, github_token)
+            skill_data = _fetch_skill_cached(skill_name, github_token)
             
             # Count bundled resources
             resource_count = sum(len(files) for files in skill_data['bundled_resources'].values())
@@ -2349,13 +2732,13 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             
             return [TextContent(
                 type="text",
-                text=json.dumps(response, indent=2)
+                text=_dumps(response)
             )]
             
         except SkillImportError as e:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": str(e)})
+                text=_dumps({"error": str(e)})
             )]
     
     elif name == "search_skills":
@@ -2367,11 +2750,19 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         query_lower = query.lower()
         
         try:
+            # The GitHub listing and the local search are independent, so
+            # run them concurrently rather than back to back
+            search_anthropic = source in ["all", "anthropic"]
+            search_imported = source in ["all", "imported"]
+            available_skills, imported = await asyncio.gather(
+                asyncio.to_thread(_list_available_skills_cached, arguments.get("github_token"))
+                if search_anthropic else asyncio.sleep(0, []),
+                asyncio.to_thread(repo.search, query, item_type=ItemType.SKILL)
+                if search_imported else asyncio.sleep(0, [])
+            )
+            
             # Search Anthropic repository if requested
-            if source in ["all", "anthropic"]:
-                github_token = arguments.get("github_token")
-                available_skills = list_available_skills(github_token)
-                
+            if search_anthropic:
                 for skill in available_skills:
                     # Simple name matching for now
                     if query_lower in skill["name"].lower():
@@ -2383,9 +2774,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
                         })
             
             # Search imported skills if requested
-            if source in ["all", "imported"]:
-                imported = repo.search(query, item_type="skill")
-                
+            if search_imported:
                 for item in imported[:limit]:
                     skill_meta = item.skill_metadata or {}
                     results.append({
@@ -2407,13 +2796,13 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             
             return [TextContent(
                 type="text",
-                text=json.dumps(response, indent=2)
+                text=_dumps(response)
             )]
             
         except SkillImportError as e:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": str(e)})
+                text=_dumps({"error": str(e)})
             )]
     
     elif name == "import_skill":
@@ -2422,27 +2811,30 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         github_token = arguments.get("github_token")
         
         try:
-            # Fetch skill from Anthropic repository
-            skill_data = fetch_skill(skill_name, github_token)
+            # Fetch skill from Anthropic repository, looking up the default
+            # project (if needed) while the HTTP requests are in flight
+            skill_data, default_project = await asyncio.gather(
+                asyncio.to_thread(_fetch_skill_cached, skill_name, github_token),
+                asyncio.to_thread(project_repo.get_default)
+                if not project_id else asyncio.sleep(0, None)
+            )
             
             # Use default project if not specified
-            if not project_id:
-                default_project = project_repo.get_default()
-                if default_project:
-                    project_id = default_project.id
+            if not project_id and default_project:
+                project_id = default_project.id
             
             # Convert to knowledge item
             item_data = skill_to_knowledge_item(skill_data, project_id)
             
-            # Check if already imported
-            existing = repo.search(f"Skill: {skill_data['name']}", item_type="skill")
+            # Check if already imported (exact title lookup; no need to load content)
+            existing_id = repo.find_id_by_title(item_data['title'], item_type=ItemType.SKILL)
             
-            if existing:
+            if existing_id:
                 return [TextContent(
                     type="text",
-                    text=json.dumps({
+                    text=_dumps({
                         "warning": f"Skill '{skill_name}' is already imported",
-                        "existing_item_id": existing[0].id,
+                        "existing_item_id": existing_id,
                         "message": "Use update_knowledge_item to modify it, or delete and reimport"
                     })
                 )]
@@ -2478,26 +2870,25 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
             
             return [TextContent(
                 type="text",
-                text=json.dumps(response, indent=2)
+                text=_dumps(response)
             )]
             
         except SkillImportError as e:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": str(e)})
+                text=_dumps({"error": str(e)})
             )]
         except Exception as e:
             return [TextContent(
                 type="text",
-                text=json.dumps({"error": f"Unexpected error: {str(e)}"})
+                text=_dumps({"error": f"Unexpected error: {str(e)}"})
             )]
     
     elif name == "get_imported_skills":
         project_id = arguments.get("project_id")
         
-        # Get all skill items
-        all_items = repo.get_all(project_id=project_id)
-        skills = [item for item in all_items if item.item_type == ItemType.SKILL]
+        # Get all skill items (filtered in SQL)
+        skills = repo.get_all(project_id=project_id, item_type=ItemType.SKILL)
         
         response = {
             "count": len(skills),
@@ -2515,7 +2906,7 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent]:
         
         return [TextContent(
             type="text",
-            text=json.dumps(response, indent=2)
+            text=_dumps(response)
         )]
     
     else: